@@ -0,0 +1,120 @@
+'''
+microbenchmark of the SaveBuffer bit access engine on the item test corpus
+
+run from the repository root:
+    python benchmarks/bench_bits.py [tests/itemdata]
+'''
+
+import os
+import sys
+import random
+import timeit
+
+from pyd2s import SaveFile
+from pyd2s.savebuffer import SaveBuffer
+
+
+class LegacySaveBuffer(SaveBuffer):
+    '''
+    a save buffer using the previous bit-at-a-time access loops, for comparison
+    '''
+    def getbits(self, start, length):
+        '''
+        produce an integer from the given bit position and length
+        '''
+        res = 0
+        for i in range(length):
+            pos = start + i
+            res |= ((self[pos >> 3] & (1 << (pos & 0x07))) != 0) << i
+        return res
+
+    def setbits(self, start, value, length):
+        '''
+        set the given bits to the given value
+        '''
+        for i in range(length):
+            pos = start + i
+            self[pos >> 3] ^= (-((value >> i) & 0x1) ^ self[pos >> 3]) & (1 << (pos & 0x07))
+
+
+def load_corpus(path):
+    '''
+    read the raw data of all item files in the given directory
+    '''
+    corpus = []
+    for name in sorted(os.listdir(path)):
+        if name.endswith('.d2i'):
+            with open(os.path.join(path, name), 'rb') as itemfile:
+                corpus.append(itemfile.read())
+    return corpus
+
+
+def bench_reads(corpus, cls, width):
+    '''
+    read every bit position of the corpus with the given field width
+    '''
+    buffers = [cls(data) for data in corpus]
+
+    def run():
+        for buffer in buffers:
+            for pos in range(len(buffer) * 8 - width + 1):
+                buffer.getbits(pos, width)
+
+    return min(timeit.repeat(run, number=1, repeat=3))
+
+
+def bench_writes(cls, width, scattered, count=20000):
+    '''
+    write fields of the given width into a buffer, all at one position or at random ones,
+    and read the changed ranges once at the end
+    '''
+    rng = random.Random(0)
+    positions = [rng.randrange(8192 * 8 - width + 1) if scattered else 100 for _ in range(count)]
+
+    def run():
+        buffer = cls(bytes(8192))
+        for pos in positions:
+            buffer.setbits(pos, 0x55, width)
+        return len(buffer.changes)
+
+    return min(timeit.repeat(run, number=1, repeat=3))
+
+
+def bench_parse(corpus, cls):
+    '''
+    parse every item of the corpus
+    '''
+    def run():
+        for data in corpus:
+            SaveFile.from_data(cls(data))
+
+    return min(timeit.repeat(run, number=1, repeat=3))
+
+
+def main():
+    '''
+    main entry point
+    '''
+    path = sys.argv[1] if len(sys.argv) > 1 else 'tests/itemdata'
+    corpus = load_corpus(path)
+    print(f'{len(corpus)} items, {sum(map(len, corpus))} bytes')
+
+    for width in [1, 7, 32]:
+        legacy = bench_reads(corpus, LegacySaveBuffer, width)
+        current = bench_reads(corpus, SaveBuffer, width)
+        print(f'getbits({width:2}) : {legacy:8.4f}s -> {current:8.4f}s ({legacy / current:5.1f}x)')
+
+    for (width, scattered) in [(1, False), (7, True)]:
+        legacy = bench_writes(LegacySaveBuffer, width, scattered)
+        current = bench_writes(SaveBuffer, width, scattered)
+        where = 'scattered' if scattered else 'one spot '
+        print(f'setbits({width:2}) {where} : {legacy:8.4f}s -> {current:8.4f}s '
+              f'({legacy / current:5.1f}x)')
+
+    legacy = bench_parse(corpus, LegacySaveBuffer)
+    current = bench_parse(corpus, SaveBuffer)
+    print(f'item parse  : {legacy:8.4f}s -> {current:8.4f}s ({legacy / current:5.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
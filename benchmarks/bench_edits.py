@@ -0,0 +1,84 @@
+'''
+microbenchmark of structural SaveBuffer edits, contiguous versus piece table, and of moving
+records like pyd2s_grail moves items, with and without a transaction
+
+run from the repository root:
+    python benchmarks/bench_edits.py [size in bytes] [number of edits]
+'''
+
+import sys
+import random
+import timeit
+import contextlib
+
+from pyd2s.savebuffer import SaveBuffer
+
+# the size of the moved records, about that of a simple item
+RECORD_SIZE = 40
+
+
+def bench_inserts(size, edits, pieces):
+    '''
+    insert and fill small records at random positions of a buffer of the given size
+    '''
+    rng = random.Random(0)
+    positions = [rng.randrange(size) for _ in range(edits)]
+
+    def run():
+        buffer = SaveBuffer(bytes(size))
+        if pieces:
+            buffer.use_piece_table()
+        for pos in positions:
+            buffer.insert_bytes(pos, 16)
+            buffer.setbits(pos * 8, 0x4d4a, 16)
+        buffer.materialize()
+
+    return min(timeit.repeat(run, number=1, repeat=3))
+
+
+def bench_moves(size, moves, transaction):
+    '''
+    move records, each tracked by a dynamic offset like an item, from random positions of a
+    buffer of the given size to its end
+    '''
+    rng = random.Random(0)
+    positions = sorted(rng.randrange(size - RECORD_SIZE) for _ in range(moves))
+
+    def run():
+        buffer = SaveBuffer(bytes(size))
+        records = [buffer.dynamic_offset(pos) for pos in positions]
+        with buffer.transaction() if transaction else contextlib.nullcontext():
+            for record in records:
+                data = bytes(buffer[record:record + RECORD_SIZE])
+                buffer.remove_bytes(record, RECORD_SIZE)
+                buffer.insert_bytes(len(buffer), data)
+        buffer.materialize()
+
+    return min(timeit.repeat(run, number=1, repeat=3))
+
+
+def main():
+    '''
+    main entry point
+    '''
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 4 * 1024 * 1024
+    edits = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    print(f'{edits} inserts into {size} bytes')
+
+    contiguous = bench_inserts(size, edits, False)
+    pieces = bench_inserts(size, edits, True)
+    print(f'contiguous  : {contiguous:8.4f}s')
+    print(f'piece table : {pieces:8.4f}s ({contiguous / pieces:5.1f}x)')
+
+    # moving every record costs a pass over the data per move without a transaction, and a
+    # single pass with one, so the transaction has to win at any realistic stash size
+    print(f'{edits} record moves in {size} bytes')
+    plain = bench_moves(size, edits, False)
+    transaction = bench_moves(size, edits, True)
+    print(f'plain       : {plain:8.4f}s')
+    print(f'transaction : {transaction:8.4f}s ({plain / transaction:5.1f}x)')
+    assert transaction < plain, 'transaction is slower than plain edits'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+'''
+benchmark of the memory held by parsed items, on a generated shared stash of rare rings
+
+run from the repository root:
+    python benchmarks/bench_memory.py [number of pages]
+'''
+
+import sys
+import struct
+import contextlib
+import tracemalloc
+
+from pyd2s import SaveFile, item, itemstat
+from pyd2s.itemstat import ItemStat, ItemProperty
+from pyd2s.savebuffer import SaveBuffer
+
+# a rare ring with ten stats, at position (0, 0) of a stash page
+RING = bytes.fromhex(
+    '4a4d100080000000002a97e60682e6551a099e314050012e400600a044c0e9008d133c297856f0b4e0'
+    '813130604ab4c643fe03')
+
+
+class LegacyItemStat(ItemStat):
+    '''
+    an item stat holding its data in an instance dict, with its itemstatcost row and a list of
+    children, as before __slots__ and the shared stat types were used, for comparison
+    '''
+    # plain class attributes hide the slots, so that the data is stored in the instance dict
+    _itemstat = _param = _value = _children = None
+
+    def __init__(self, code, param, value):
+        '''
+        constructor
+        '''
+        super().__init__(code, param, value)
+        self._itemstat = self._type.row
+        self._children = []
+
+
+class LegacyItemProperty(ItemProperty):
+    '''
+    an item property holding its data in an instance dict, for comparison
+    '''
+    # pylint: disable=R0903
+    _code = _param = _min_value = _max_value = _property = _itemstat = None
+
+
+@contextlib.contextmanager
+def legacy_classes():
+    '''
+    construct the legacy stat and property classes while parsing items within the context
+    '''
+    saved = (itemstat.ItemStat, item.ItemStat, item.ItemProperty)
+    (itemstat.ItemStat, item.ItemStat, item.ItemProperty) = \
+        (LegacyItemStat, LegacyItemStat, LegacyItemProperty)
+    try:
+        yield
+    finally:
+        (itemstat.ItemStat, item.ItemStat, item.ItemProperty) = saved
+
+
+def generate_stash(pages):
+    '''
+    produce a shared stash with the given number of pages filled with rings
+    '''
+    data = bytearray(b'SSS\0' + b'02' + struct.pack('<LL', 0, pages))
+    for _ in range(pages):
+        data += b'ST' + struct.pack('<L', 1) + b'\0' + b'JM' + struct.pack('<H', 100)
+        for pos in range(100):
+            ring = SaveBuffer(RING)
+            ring.setbits(65, pos % 10, 4)
+            ring.setbits(69, pos // 10, 4)
+            data += bytes(ring)
+    return bytes(data)
+
+
+def measure(data):
+    '''
+    parse all items of the given stash, and produce the number of items and the memory held
+    by the parsed save file in bytes
+    '''
+    tracemalloc.start()
+    save = SaveFile.from_data(data)
+    count = sum(len(page.idata) for page in save.pages)
+    (size, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return (count, size)
+
+
+def main():
+    '''
+    main entry point
+    '''
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    data = generate_stash(pages)
+
+    # parse once to load the game data tables, which are not counted
+    measure(generate_stash(1))
+
+    with legacy_classes():
+        (count, legacy) = measure(data)
+    (count, current) = measure(data)
+
+    print(f'{count} items, {len(data)} bytes')
+    print(f'memory      : {legacy / 1024 / 1024:8.2f} MiB -> {current / 1024 / 1024:8.2f} MiB '
+          f'({legacy / current:5.2f}x)')
+    print(f'per item    : {legacy / count:8.0f} B   -> {current / count:8.0f} B')
+
+
+if __name__ == '__main__':
+    main()
@@ -2,18 +2,18 @@
 This module provides classes to manage D2 save games.
 '''
 
-import struct
 import logging
 from enum import Enum
 
 from pyd2s.savebuffer import SaveBuffer
-from pyd2s.character import Character
+from pyd2s.character import Character, CharacterClass
 from pyd2s.mercenary import Mercenary
 from pyd2s.itemdata import ItemData
 from pyd2s.item import Item
 from pyd2s.questdata import QuestData
 from pyd2s.waypointdata import WaypointData
 from pyd2s.plugydata import PlugyStashPage
+from pyd2s.forking import fork_object
 
 
 class SaveFile:
@@ -37,28 +37,58 @@ class SaveFile:
         D2X = 3  # PlugY personal stash
 
     @classmethod
-    def open(cls, path):
+    def open(cls, path, mode='r+', pieces=False, sections=None):
         '''
-        open a file by path and parse the data
+        open a file by path and parse the data, optionally keeping it in a piece table. in
+        mode 'r', the file is memory-mapped read-only. sections selects the sections of a d2s
+        file that are parsed right away, see D2SaveFile.
         '''
-        return cls.from_data(SaveBuffer.open(path))
+        return cls.from_data(SaveBuffer.open(path, mode, pieces), sections)
 
     @classmethod
-    def from_data(cls, buffer):
+    def peek(cls, path):
         '''
-        open a file from a given savebuffer
+        read only the header of a file by path, and produce a SaveSummary of it. the items
+        and other sections of the file are neither read nor parsed.
+        '''
+        # the header of a d2s file and its stat section cover the headers of all other types
+        with open(path, 'rb') as save:
+            buffer = SaveBuffer(save.read(765 + Character.StatData.max_length()))
+
+        return SaveSummary(path, cls._detect(buffer), buffer)
+
+    @classmethod
+    def from_data(cls, buffer, sections=None):
+        '''
+        open a file from a given savebuffer. sections selects the sections of a d2s file that
+        are parsed right away, and is ignored for other types of files.
         '''
         if not isinstance(buffer, SaveBuffer):
             buffer = SaveBuffer(buffer)
 
-        if struct.unpack_from('<L', buffer)[0] == 0xaa55aa55:
-            return D2SaveFile(buffer)
-        if buffer[:2].decode('ascii') == 'JM':
-            return D2ItemFile(buffer)
-        if buffer[:4].decode('ascii') == 'SSS\0':
-            return PlugySharedStash(buffer)
-        if buffer[:4].decode('ascii') == 'CSTM':
-            return PlugyPersonalStash(buffer)
+        kind = cls._detect(buffer)
+        if kind == cls.Type.D2S:
+            return D2SaveFile(buffer, sections)
+
+        return {
+            cls.Type.D2I: D2ItemFile,
+            cls.Type.SSS: PlugySharedStash,
+            cls.Type.D2X: PlugyPersonalStash,
+        }[kind](buffer)
+
+    @classmethod
+    def _detect(cls, buffer):
+        '''
+        determine the type of save file from the header in the given savebuffer
+        '''
+        if len(buffer) >= 4 and buffer.unpack_from('<L')[0] == 0xaa55aa55:
+            return cls.Type.D2S
+        if buffer[:2] == b'JM':
+            return cls.Type.D2I
+        if buffer[:4] == b'SSS\0':
+            return cls.Type.SSS
+        if buffer[:4] == b'CSTM':
+            return cls.Type.D2X
 
         raise ValueError('invalid save: unrecognized file header')
 
@@ -68,18 +98,52 @@ class SaveFile:
         '''
         self._buffer = buffer
 
-    def flush(self, backup=False):
+    def flush(self, backup=False, async_=False):
+        '''
+        flush the savebuffer, writing changes to disk. with async_, the write happens in the
+        background and a future of it is returned.
+        '''
+        return self._buffer.flush(backup, async_)
+
+    def transaction(self):
         '''
-        flush the savebuffer, writing changes to disk
+        coalesce the structural edits to the save data made within a with-block
         '''
-        self._buffer.flush(backup)
+        return self._buffer.transaction()
+
+    def make_writable(self):
+        '''
+        allow modifications of a save file opened read-only
+        '''
+        self._buffer.make_writable()
+
+    def fork(self):
+        '''
+        produce an independent copy of the save file for what-if edits, without parsing the
+        data again. the copy shares the data of the buffer and the decoded values of the
+        parsed objects, and only copies the pages of data it modifies.
+        '''
+        return fork_object(self)
 
 
 class D2SaveFile(SaveFile):
     '''
-    a .d2s file containing diablo 2 save game data
+    a .d2s file containing diablo 2 save game data.
+
+    the sections of the file are named 'character', 'mercenary', 'quests', 'waypoints' and
+    'items'. only the selected sections are parsed by the constructor, all of them by
+    default, and the others are parsed on first access of their attribute.
     '''
-    def __init__(self, buffer):
+    # the attributes holding the sections of the file, by section name
+    SECTIONS = {
+        'character': 'character',
+        'mercenary': 'mercenary',
+        'quests': 'questdata',
+        'waypoints': 'waypointdata',
+        'items': 'itemdata',
+    }
+
+    def __init__(self, buffer, sections=None):
         '''
         constructor - initialize buffer and do sanity checks
         '''
@@ -95,11 +159,34 @@ class D2SaveFile(SaveFile):
         if len(buffer) <= 335:
             logging.warning('sparse save: has never been saved in-game.')
 
-        self.character = Character(self._buffer)
-        self.mercenary = Mercenary(self._buffer)
-        self.questdata = QuestData(self._buffer)
-        self.waypointdata = WaypointData(self._buffer)
-        self.itemdata = ItemData(self, self._buffer, 765 + self.character.stats.length + 32)
+        sections = self.SECTIONS if sections is None else sections
+        unknown = set(sections) - set(self.SECTIONS)
+        if unknown:
+            raise ValueError(f'unknown sections: {", ".join(sorted(unknown))}')
+
+        for (section, name) in self.SECTIONS.items():
+            if section in sections:
+                getattr(self, name)
+
+    def __getattr__(self, name):
+        '''
+        parse the sections of the file that were not selected on first access
+        '''
+        if name == 'character':
+            value = Character(self._buffer)
+        elif name == 'mercenary':
+            value = Mercenary(self._buffer)
+        elif name == 'questdata':
+            value = QuestData(self._buffer)
+        elif name == 'waypointdata':
+            value = WaypointData(self._buffer)
+        elif name == 'itemdata':
+            value = ItemData(self, self._buffer, 765 + self.character.stats.length + 32)
+        else:
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+        setattr(self, name, value)
+        return value
 
     @property
     def type(self):
@@ -113,49 +200,47 @@ class D2SaveFile(SaveFile):
         '''
         get the magic number of d2s files - should be 0xaa55aa55
         '''
-        return struct.unpack_from('<L', self._buffer, 0)[0]
+        return self._buffer.unpack_from('<L', 0)[0]
 
     @property
     def version(self):
         '''
         get the version of the file - supported values are 0x60 for >=1.10
         '''
-        return struct.unpack_from('<L', self._buffer, 0x04)[0]
+        return self._buffer.unpack_from('<L', 0x04)[0]
 
     @property
     def timestamp(self):
         '''
         get the last save timestamp
         '''
-        return struct.unpack_from('<L', self._buffer, 0x30)[0]
+        return self._buffer.unpack_from('<L', 0x30)[0]
 
     @property
     def _checksum(self):
         '''
         get the checksum of the save data
         '''
-        return struct.unpack_from('<L', self._buffer, 0x0c)[0]
+        return self._buffer.unpack_from('<L', 0x0c)[0]
 
     @_checksum.setter
     def _checksum(self, value):
         '''
         set the checksum of the save data
         '''
-        struct.pack_into('<L', self._buffer, 0x0c, value)
+        self._buffer.pack_into('<L', 0x0c, value)
 
-    def flush(self, backup=False):
+    def flush(self, backup=False, async_=False):
         '''
         flush the save data back to file, if not newer on disk
         '''
-        # update checksum
-        self._checksum = 0
-
-        checksum = 0
-        for byte in self._buffer:
-            checksum = (((checksum << 1) | (checksum & 0x80000000 > 0)) + byte) & 0xffffffff
-        self._checksum = checksum
+        # update checksum, unless nothing changed that it depends on
+        if self._buffer.changes:
+            checksum = self._buffer.checksum()
+            if checksum != self._checksum:
+                self._checksum = checksum
 
-        super().flush(backup)
+        return super().flush(backup, async_)
 
 
 class D2ItemFile(SaveFile):
@@ -190,7 +275,7 @@ class D2ItemFile(SaveFile):
         '''
         get the version of the file - supported values are 0x60 for >=1.10
         '''
-        return struct.unpack_from('<L', self._buffer, 0x02)[0]
+        return self._buffer.unpack_from('<L', 0x02)[0]
 
     @property
     def type(self):
@@ -252,7 +337,7 @@ class PlugyStash(SaveFile):
         '''
         read the pages in the stash
         '''
-        num_pages = struct.unpack_from('<L', self._buffer, self._pcount_pos)[0]
+        num_pages = self._buffer.unpack_from('<L', self._pcount_pos)[0]
 
         ptr = self._pcount_pos + 4
 
@@ -272,7 +357,7 @@ class PlugyStash(SaveFile):
         self._pages.remove(page)
 
         # update the page count
-        struct.pack_into('<L', self._buffer, self._pcount_pos, len(self._pages))
+        self._buffer.pack_into('<L', self._pcount_pos, len(self._pages))
 
         # detach the page from the buffer
         page.detach()
@@ -296,7 +381,7 @@ class PlugyStash(SaveFile):
         self._pages.append(page)
 
         # update the page count
-        struct.pack_into('<L', self._buffer, self._pcount_pos, len(self._pages))
+        self._buffer.pack_into('<L', self._pcount_pos, len(self._pages))
 
     def clear(self):
         '''
@@ -351,7 +436,7 @@ class PlugySharedStash(PlugyStash):
         '''
         if self.version != 2:
             return 0
-        return struct.unpack_from('<L', self._buffer, 0x06)[0]
+        return self._buffer.unpack_from('<L', 0x06)[0]
 
     @stored_gold.setter
     def stored_gold(self, value):
@@ -361,7 +446,7 @@ class PlugySharedStash(PlugyStash):
         if self.version != 2:
             self.version = 2
             self._buffer.insert_bytes(0x06, 4)
-        struct.pack_into('<L', self._buffer, 0x06, value)
+        self._buffer.pack_into('<L', 0x06, value)
 
 
 class PlugyPersonalStash(PlugyStash):
@@ -394,3 +479,154 @@ class PlugyPersonalStash(PlugyStash):
         indicate the type of save file this is
         '''
         return SaveFile.Type.D2X
+
+
+class SaveSummary:
+    '''
+    the header data of a save file, as produced by SaveFile.peek. the fields that do not
+    apply to the type of the file are None.
+    '''
+    def __init__(self, path, save_type, buffer):
+        '''
+        constructor
+        '''
+        self._path = path
+        self._type = save_type
+        self._buffer = buffer
+
+        self._stats = None
+        if save_type == SaveFile.Type.D2S:
+            if len(buffer) < 335:
+                raise ValueError('invalid save: truncated data')
+            self._stats = Character.StatData(buffer)
+
+    def __repr__(self):
+        '''
+        a string representation of the summary
+        '''
+        if self._type == SaveFile.Type.D2S:
+            details = f'{self.name!r}, {self.character_class.name}, level {self.level}'
+        elif self._type == SaveFile.Type.D2I:
+            details = f'version {self.version}'
+        else:
+            details = f'{self.page_count} pages'
+        return f'SaveSummary({self._path!r}, {self._type.name}, {details})'
+
+    @property
+    def path(self):
+        '''
+        the path of the save file
+        '''
+        return self._path
+
+    @property
+    def type(self):
+        '''
+        the type of the save file
+        '''
+        return self._type
+
+    @property
+    def version(self):
+        '''
+        the version of the save file
+        '''
+        if self._type == SaveFile.Type.D2S:
+            return self._buffer.unpack_from('<L', 0x04)[0]
+        if self._type == SaveFile.Type.D2I:
+            return self._buffer.unpack_from('<L', 0x02)[0]
+        return int(self._buffer[4:6].decode('ascii'))
+
+    def _character_field(self, field):
+        '''
+        read the given bit field of the character, if this is a d2s file
+        '''
+        if self._stats is None:
+            return None
+        return bool(self._buffer.getbits(field.offset, field.width))
+
+    @property
+    def name(self):
+        '''
+        the name of the character
+        '''
+        if self._stats is None:
+            return None
+        return self._buffer[20:36].decode('ascii').rstrip('\0')
+
+    @property
+    def character_class(self):
+        '''
+        the class of the character
+        '''
+        if self._stats is None:
+            return None
+        return CharacterClass(self._buffer[40])
+
+    @property
+    def level(self):
+        '''
+        the level of the character
+        '''
+        if self._stats is None:
+            return None
+        return self._buffer[43]
+
+    @property
+    def is_expansion(self):
+        '''
+        True if an extension (LoD) character, False otherwise
+        '''
+        return self._character_field(Character.is_expansion)
+
+    @property
+    def is_hardcore(self):
+        '''
+        True if the character is a hardcore character, False otherwise
+        '''
+        return self._character_field(Character.is_hardcore)
+
+    @property
+    def has_died(self):
+        '''
+        True if the character has died in the past, False otherwise
+        '''
+        return self._character_field(Character.has_died)
+
+    @property
+    def timestamp(self):
+        '''
+        the last save timestamp of the character
+        '''
+        if self._stats is None:
+            return None
+        return self._buffer.unpack_from('<L', 0x30)[0]
+
+    @property
+    def stats(self):
+        '''
+        the stat data of the character, indexed by Character.StatData.CharacterStat
+        '''
+        return self._stats
+
+    @property
+    def page_count(self):
+        '''
+        the number of pages in a plugy stash
+        '''
+        if self._type == SaveFile.Type.SSS:
+            return self._buffer.unpack_from('<L', 6 + (4 if self.version == 2 else 0))[0]
+        if self._type == SaveFile.Type.D2X:
+            return self._buffer.unpack_from('<L', 10)[0]
+        return None
+
+    @property
+    def stored_gold(self):
+        '''
+        the amount of gold stored in a shared plugy stash
+        '''
+        if self._type != SaveFile.Type.SSS:
+            return None
+        if self.version != 2:
+            return 0
+        return self._buffer.unpack_from('<L', 0x06)[0]
@@ -0,0 +1,119 @@
+'''
+this module provides a declarative description of fixed-width fields in save buffers
+'''
+
+
+class BitField:
+    '''
+    a fixed-width field of a save buffer, used as a class attribute of objects that have a
+    _buffer and an _offset in bytes. the field is located at a bit offset relative to that.
+
+    reads are decoded once and cached on the instance, writes go through to the buffer and
+    keep the cached value coherent. decode_all decodes all fields of an instance at once.
+    '''
+    # pylint: disable=W0212,R0902,R0913,R0917
+
+    # the bit fields of each owner class, including those of its bases, ordered by offset
+    _fields = {}
+
+    def __init__(self, offset, width, decode=int, encode=int, writable=False, doc=None):
+        '''
+        constructor
+        '''
+        self._offset = offset
+        self._width = width
+        self._decode = decode
+        self._encode = encode
+        self._writable = writable
+        self._name = None
+        self._key = None
+        self.__doc__ = doc
+
+    def __set_name__(self, owner, name):
+        '''
+        remember the name of the field and derive the instance cache key
+        '''
+        self._name = name
+        self._key = f'_{name}_field'
+
+    @property
+    def offset(self):
+        '''
+        the bit offset of the field relative to the offset of its owner
+        '''
+        return self._offset
+
+    @property
+    def width(self):
+        '''
+        the width of the field in bits
+        '''
+        return self._width
+
+    def __get__(self, instance, owner=None):
+        '''
+        produce the decoded field value, reading from the buffer on first access
+        '''
+        if instance is None:
+            return self
+
+        cache = instance.__dict__
+        if self._key in cache:
+            return cache[self._key]
+
+        raw = instance._buffer.getbits(instance._offset * 8 + self._offset, self._width)
+        value = cache[self._key] = self._decode(raw)
+        return value
+
+    def __set__(self, instance, value):
+        '''
+        write the field value through to the buffer
+        '''
+        if not self._writable:
+            raise AttributeError(f"field '{self._name}' of '{type(instance).__name__}' "
+                                 "object is read-only")
+
+        raw = self._encode(value) & ((1 << self._width) - 1)
+        instance._buffer.setbits(instance._offset * 8 + self._offset, raw, self._width)
+        instance.__dict__[self._key] = self._decode(raw)
+
+    @classmethod
+    def fields_of(cls, owner):
+        '''
+        produce the bit fields of the given class and its bases, ordered by offset
+        '''
+        if owner not in cls._fields:
+            fields = {}
+            for klass in reversed(owner.__mro__):
+                fields.update((name, value) for (name, value) in vars(klass).items()
+                              if isinstance(value, BitField))
+            cls._fields[owner] = sorted(fields.values(), key=lambda field: field._offset)
+        return cls._fields[owner]
+
+    @classmethod
+    def decode_all(cls, instance):
+        '''
+        decode all bit fields of the given instance with a single buffer access, and cache
+        their values. fields with values that can not be decoded are left to be decoded on
+        access.
+        '''
+        fields = cls.fields_of(type(instance))
+        if not fields:
+            return
+
+        end = max(field._offset + field._width for field in fields)
+        word = instance._buffer.getbits(instance._offset * 8, end)
+
+        cache = instance.__dict__
+        for field in fields:
+            try:
+                cache[field._key] = field._decode(
+                    (word >> field._offset) & ((1 << field._width) - 1))
+            except ValueError:
+                pass
+
+    def invalidate(self, instance):
+        '''
+        drop the cached value of the field on the given instance
+        '''
+        instance.__dict__.pop(self._key, None)
@@ -0,0 +1,243 @@
+'''
+this module provides the tracking of changed byte ranges in save buffers
+'''
+
+import bisect
+import operator
+import itertools
+
+
+class ChangedRanges:
+    '''
+    the byte ranges of a buffer that changed since it was last written, in the current
+    positions of the buffer. overlapping and adjacent ranges are merged, and ranges behind a
+    structural edit move along with the data. removed bytes leave an empty range where they
+    used to be.
+
+    the ranges are partitioned into buckets of neighbouring ranges, like the buckets of the
+    dynamic offset registry. each bucket carries a shift that applies to its ranges and to
+    those of all buckets behind it, so that an edit only rewrites the ranges of the buckets
+    it touches and a single shift. the accumulated shifts are recomputed lazily.
+
+    changes that do not insert or remove bytes are only collected, extending the last one
+    where they overlap or touch it, and are sorted into the buckets when the ranges are read
+    or a structural edit is made.
+    '''
+    # the number of ranges at which a bucket is split
+    BUCKET_SIZE = 128
+
+    class Bucket:
+        '''
+        a group of neighbouring ranges, relative to the accumulated shift of the buckets
+        '''
+        # pylint: disable=R0903
+        __slots__ = ('starts', 'ends', 'shift')
+
+        def __init__(self, starts, ends, shift=0):
+            '''
+            constructor
+            '''
+            self.starts = starts
+            self.ends = ends
+            self.shift = shift
+
+    def __init__(self):
+        '''
+        constructor
+        '''
+        self._buckets = []
+        self._deltas = None
+        self._structural = False
+
+        # the (start, end) tuples of the changes not yet sorted into the buckets
+        self._recent = []
+
+    def _bucket_deltas(self):
+        '''
+        produce the accumulated shift of each bucket, recomputing them if they changed
+        '''
+        if self._deltas is None:
+            self._deltas = list(itertools.accumulate(
+                map(operator.attrgetter('shift'), self._buckets)))
+        return self._deltas
+
+    def update(self, start, end, length):
+        '''
+        note that the bytes from start to end have been replaced by length bytes
+        '''
+        delta = length - (end - start)
+        if not delta:
+            recent = self._recent
+            if recent:
+                (last_start, last_end) = recent[-1]
+                if start <= last_end and last_start <= end:
+                    if start < last_start or last_end < end:
+                        recent[-1] = (min(start, last_start), max(end, last_end))
+                    return
+            recent.append((start, end))
+            return
+
+        self._structural = True
+        self._normalize()
+        self._splice(start, end, length)
+
+    def _splice(self, start, end, length):
+        '''
+        merge the replacement of the bytes from start to end by length bytes into the buckets
+        '''
+        delta = length - (end - start)
+        buckets = self._buckets
+        if not buckets:
+            buckets.append(self.Bucket([start], [start + length]))
+            self._deltas = None
+            return
+
+        # the buckets holding ranges that may overlap or touch the edit
+        deltas = self._bucket_deltas()
+        indices = range(len(buckets))
+        first = bisect.bisect_left(indices, start, key=lambda i: buckets[i].ends[-1] + deltas[i])
+        last = bisect.bisect_right(indices, end, key=lambda i: buckets[i].starts[0] + deltas[i])
+        first = min(first, len(buckets) - 1)
+        last = max(last, first + 1)
+
+        # the ranges are merged relative to the shift of the first bucket
+        base = deltas[first]
+        if last == first + 1:
+            (starts, ends) = (buckets[first].starts, buckets[first].ends)
+        else:
+            touched = [(buckets[i], deltas[i] - base) for i in range(first, last)]
+            starts = [pos + shift for (bucket, shift) in touched for pos in bucket.starts]
+            ends = [pos + shift for (bucket, shift) in touched for pos in bucket.ends]
+        self._merge(starts, ends, start - base, end - base, length)
+
+        if last == first + 1 and len(starts) <= self.BUCKET_SIZE and not delta:
+            return
+
+        # the buckets behind the edit move along with the data
+        if last < len(buckets):
+            buckets[last].shift = deltas[last] + delta - base
+
+        if last > first + 1 or len(starts) > self.BUCKET_SIZE:
+            size = self.BUCKET_SIZE // 2 if len(starts) > self.BUCKET_SIZE else len(starts)
+            buckets[first:last] = [
+                self.Bucket(starts[pos:pos + size], ends[pos:pos + size],
+                            buckets[first].shift if not pos else 0)
+                for pos in range(0, len(starts), size)]
+        self._deltas = None
+
+    def _normalize(self):
+        '''
+        sort the collected changes into the buckets. a few of them are merged one by one,
+        many of them are merged with the ranges in the buckets in a single pass.
+        '''
+        recent = self._recent
+        if not recent:
+            return
+        self._recent = []
+
+        if len(recent) < self.BUCKET_SIZE:
+            for (start, end) in recent:
+                self._splice(start, end, end - start)
+            return
+
+        (starts, ends) = ([], [])
+        for (start, end) in sorted(itertools.chain(self._ranges(), recent)):
+            if starts and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+
+        size = self.BUCKET_SIZE // 2
+        self._buckets = [self.Bucket(starts[pos:pos + size], ends[pos:pos + size])
+                         for pos in range(0, len(starts), size)]
+        self._deltas = None
+
+    def _ranges(self):
+        '''
+        iterate over the ranges in the buckets as (start, end) tuples, in order
+        '''
+        for (bucket, delta) in zip(self._buckets, self._bucket_deltas()):
+            yield from ((start + delta, end + delta)
+                        for (start, end) in zip(bucket.starts, bucket.ends))
+
+    @staticmethod
+    def _merge(starts, ends, start, end, length):
+        '''
+        merge the edit of the bytes from start to end into the given sorted lists of range
+        starts and ends, moving the ranges behind it
+        '''
+        delta = length - (end - start)
+
+        # the ranges that overlap or touch the edit are merged with it
+        first = bisect.bisect_left(ends, start)
+        last = bisect.bisect_right(starts, end)
+
+        (new_start, new_end) = (start, start + length)
+        if first < last:
+            new_start = min(new_start, starts[first])
+            new_end = max(new_end, ends[last - 1] + delta)
+
+        if delta:
+            starts[last:] = [pos + delta for pos in starts[last:]]
+            ends[last:] = [pos + delta for pos in ends[last:]]
+
+        starts[first:last] = [new_start]
+        ends[first:last] = [new_end]
+
+    def merge(self, other):
+        '''
+        note the ranges of another set of changes to the same buffer as changed as well
+        '''
+        for (start, end) in list(other):
+            self.update(start, end, end - start)
+        self._structural |= other.structural
+
+    def clear(self):
+        '''
+        forget all changes, after the buffer has been written
+        '''
+        self._buckets.clear()
+        self._deltas = None
+        self._structural = False
+        self._recent.clear()
+
+    @property
+    def structural(self):
+        '''
+        indicate whether bytes were inserted or removed
+        '''
+        return self._structural
+
+    @property
+    def size(self):
+        '''
+        the number of changed bytes
+        '''
+        return sum(end - start for (start, end) in self)
+
+    def __iter__(self):
+        '''
+        iterate over the changed ranges as (start, end) tuples, in order
+        '''
+        self._normalize()
+        return self._ranges()
+
+    def __len__(self):
+        '''
+        the number of changed ranges
+        '''
+        self._normalize()
+        return sum(len(bucket.starts) for bucket in self._buckets)
+
+    def __bool__(self):
+        '''
+        indicate whether anything changed
+        '''
+        return bool(self._buckets or self._recent)
+
+    def __repr__(self):
+        '''
+        a string representation of the changed ranges
+        '''
+        return f'ChangedRanges({list(self)})'
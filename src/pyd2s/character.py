@@ -8,6 +8,7 @@ import logging
 from enum import Enum
 from os.path import dirname, join, isfile
 
+from pyd2s.bitfield import BitField
 from pyd2s.gamedata import GameData
 
 
@@ -348,6 +349,18 @@ class Character:
     '''
     save data referring to the character itself
     '''
+    # the character fields are located relative to the start of the save file
+    _offset = 0
+
+    is_expansion = BitField(
+        36 * 8 + 5, 1, bool,
+        doc='True if an extension (LoD) character, False otherwise')
+    has_died = BitField(
+        36 * 8 + 3, 1, bool, writable=True,
+        doc='True if the character has died in the past, False otherwise')
+    is_hardcore = BitField(
+        36 * 8 + 2, 1, bool, writable=True,
+        doc='True if the character is a hardcore character, False otherwise')
 
     class StatData:
         '''
@@ -410,6 +423,14 @@ class Character:
                 logging.debug('character:%s = %d', stat, value)
             self._end = ptr.value
 
+        @classmethod
+        def max_length(cls):
+            '''
+            the largest possible length of the stat section in bytes, with all stats present
+            '''
+            bits = 16 + sum(9 + stat.bits for stat in cls.CharacterStat) + 9
+            return (bits - 1) // 8 + 1
+
         @property
         def _header(self):
             '''
@@ -562,41 +583,6 @@ class Character:
         self._buffer.path = newpath
         self._buffer[20:36] = value.ljust(16, '\0').encode('ascii')
 
-    @property
-    def is_expansion(self):
-        '''
-        True if an extension (LoD) character, False otherwise
-        '''
-        return (self._buffer[36] & (1 << 5)) != 0
-
-    @property
-    def has_died(self):
-        '''
-        True if the character has died in the past, False otherwise
-        '''
-        return (self._buffer[36] & (1 << 3)) != 0
-
-    @has_died.setter
-    def has_died(self, value):
-        '''
-        set wether the character has died in the past
-        '''
-        self._buffer[36] ^= (-bool(value) ^ self._buffer[36]) & (1 << 3)
-
-    @property
-    def is_hardcore(self):
-        '''
-        True if the character is a hardcore character, False otherwise
-        '''
-        return (self._buffer[36] & (1 << 2)) != 0
-
-    @is_hardcore.setter
-    def is_hardcore(self, value):
-        '''
-        set wether the character is a hardcore character
-        '''
-        self._buffer[36] ^= (-bool(value) ^ self._buffer[36]) & (1 << 2)
-
     @property
     def character_class(self):
         '''
@@ -0,0 +1,214 @@
+'''
+this module provides the rotate-and-add checksum of d2s save files
+
+the checksum is computed over the whole file, with the stored checksum counted as zero:
+each step rotates the 32-bit state left by one and adds the next byte. a left rotation of a
+32-bit value is a multiplication by two modulo 2^32-1, so as long as none of the additions
+overflows, the state after a byte is a weighted sum of the bytes before it modulo 2^32-1,
+which can be computed in blocks. an addition overflows exactly when the new state is
+smaller than the byte that was added, so the block computation runs until it reaches the
+first state that may be affected by that, and resumes after stepping over it exactly. the
+blocks after such a state start out small and grow again, so that frequent overflows cost
+no more than the exact loop. a state of zero is ambiguous modulo 2^32-1, and stays zero
+over runs of zero bytes, so these runs are skipped.
+'''
+
+import struct
+import functools
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+
+# the offset and size of the stored checksum in d2s files
+CHECKSUM_OFFSET = 0x0c
+CHECKSUM_SIZE = 4
+
+# the modulus of 32-bit rotations
+_MODULUS = 0xffffffff
+
+# the number of bytes handled per vectorized block
+_BLOCK_SIZE = 1 << 16
+
+# the number of bytes stepped over exactly after a possible overflow
+_STRETCH = 256
+
+# inputs shorter than this are not worth the vectorization overhead
+_MIN_VECTORIZED = 512
+
+
+def _checksum_loop(data, state=0):
+    '''
+    advance the checksum state over the given bytes, one byte at a time
+    '''
+    for byte in data:
+        state = ((state << 1 | state >> 31) + byte) & 0xffffffff
+    return state
+
+
+@functools.cache
+def _rotation_tables():
+    '''
+    produce the per-position weight shifts and state rotations of a vectorized block
+    '''
+    index = numpy.arange(_BLOCK_SIZE, dtype=numpy.uint64)
+    # the weight of byte t in a block is 2^-(t+1), and the state after it is rotated by t+1
+    shifts = (numpy.uint64(31) - index) % numpy.uint64(32)
+    rotations = (index + numpy.uint64(1)) % numpy.uint64(32)
+    return (shifts, rotations)
+
+
+def _zero_run(values):
+    '''
+    produce the number of zero bytes at the start of the given values
+    '''
+    nonzero = numpy.flatnonzero(values)
+    return int(nonzero[0]) if nonzero.size else len(values)
+
+
+def _checksum_blocks(data, state=0):
+    '''
+    advance the checksum state over the given bytes in vectorized blocks
+    '''
+    values = numpy.frombuffer(data, dtype=numpy.uint8)
+    (shifts, rotations) = _rotation_tables()
+
+    pos = 0
+    limit = _BLOCK_SIZE
+    while pos < len(values):
+        if not state and not values[pos]:
+            pos += _zero_run(values[pos:pos + _BLOCK_SIZE])
+            continue
+
+        block = values[pos:pos + limit].astype(numpy.uint64)
+        size = len(block)
+
+        prefix = numpy.cumsum(block << shifts[:size])
+        prefix += numpy.uint64(state)
+        prefix %= numpy.uint64(_MODULUS)
+
+        rotation = rotations[:size]
+        states = ((prefix << rotation) | (prefix >> (numpy.uint64(32) - rotation)))
+        states &= numpy.uint64(0xffffffff)
+
+        # states below the added byte indicate an overflow, and zero is ambiguous
+        suspects = numpy.flatnonzero((states < block) | (states == 0))
+        if not suspects.size:
+            state = int(states[-1])
+            pos += size
+            limit = min(limit * 2, _BLOCK_SIZE)
+            continue
+
+        first = int(suspects[0])
+        if first:
+            state = int(states[first - 1])
+        end = min(pos + first + _STRETCH, len(values))
+        state = _checksum_loop(data[pos + first:end], state)
+        pos = end
+        limit = _MIN_VECTORIZED
+
+    return state
+
+
+def _advance(data, state=0):
+    '''
+    advance the checksum state over the given bytes
+    '''
+    if numpy is None or len(data) < _MIN_VECTORIZED:
+        return _checksum_loop(data, state)
+    return _checksum_blocks(data, state)
+
+
+def _clear_checksum(data, pos=0):
+    '''
+    produce the given data starting at pos, with the stored checksum zeroed out
+    '''
+    data = bytes(data)
+    start = min(max(CHECKSUM_OFFSET - pos, 0), len(data))
+    end = min(max(CHECKSUM_OFFSET + CHECKSUM_SIZE - pos, 0), len(data))
+    if start < end:
+        data = data[:start] + bytes(end - start) + data[end:]
+    return data
+
+
+def compute_checksum(data):
+    '''
+    compute the checksum of the given save data, counting the stored checksum as zero
+    '''
+    return _advance(_clear_checksum(data))
+
+
+def verify_checksum(data):
+    '''
+    check whether the checksum stored in the given save data matches its contents
+    '''
+    data = bytes(data)
+    if len(data) < CHECKSUM_OFFSET + CHECKSUM_SIZE:
+        return False
+    return struct.unpack_from('<L', data, CHECKSUM_OFFSET)[0] == compute_checksum(data)
+
+
+class IncrementalChecksum:
+    '''
+    the checksum of a buffer, kept up to date across edits.
+
+    the checksum states at regular intervals are remembered, so that after an edit only the
+    data behind the first changed byte needs to be processed again. a byte contributes to
+    the checksum rotated by its distance to the end only modulo 2^32-1, the carries of the
+    additions depend on the actual states, so patching the checksum without running over
+    the data behind an edit is not exact.
+
+    the distance between the states scales with the size of the buffer, so that an edit
+    processes about the data behind it, and at most a small fraction of the buffer in front
+    of it. it is chosen whenever no states are remembered.
+    '''
+    # the number of states remembered across the buffer
+    STATES = 64
+    # the smallest distance between remembered checksum states in bytes
+    MIN_INTERVAL = 64
+
+    def __init__(self):
+        '''
+        constructor
+        '''
+        # the states before every interval-th byte that are still valid
+        self._states = [0]
+        self._interval = self.MIN_INTERVAL
+        self._value = None
+
+    def invalidate(self, start, end=None):
+        '''
+        discard the states that depend on the data changed from start to end, or from start
+        on for structural edits. changes to the stored checksum itself are ignored.
+        '''
+        if end is not None and CHECKSUM_OFFSET <= start and end <= CHECKSUM_OFFSET + CHECKSUM_SIZE:
+            return
+
+        del self._states[start // self._interval + 1:]
+        self._value = None
+
+    def update(self, buffer):
+        '''
+        produce the checksum of the given buffer, processing only the data that changed
+        since the last update
+        '''
+        if self._value is not None:
+            return self._value
+
+        if len(self._states) == 1:
+            self._interval = max(self.MIN_INTERVAL, len(buffer) // self.STATES)
+        interval = self._interval
+
+        pos = (len(self._states) - 1) * interval
+        data = memoryview(_clear_checksum(buffer[pos:], pos))
+
+        state = self._states[-1]
+        while len(data) >= interval:
+            state = _advance(data[:interval], state)
+            self._states.append(state)
+            data = data[interval:]
+
+        self._value = _advance(data, state)
+        return self._value
@@ -0,0 +1,286 @@
+'''
+this module provides a structural comparison of two save buffers
+
+identical byte runs are skipped with block-wise comparisons of memory views. the item
+records are only delimited by scanning, and only those overlapping the differing runs are
+constructed. these are aligned by their unique id, or by their type and location for items
+without one, and decoded field by field if their raw data differs. the remaining data around
+the item records is compared byte-wise.
+'''
+
+import bisect
+import itertools
+import collections
+
+from pyd2s import SaveFile
+from pyd2s.item import Item, ExtendedItem
+from pyd2s.savebuffer import SaveBuffer
+
+# the sizes of the blocks compared at once, from coarse to fine
+_BLOCK_SIZES = (4096, 64, 1)
+
+
+class ItemChange:
+    '''
+    an item that is present in both save buffers, but differs between them
+    '''
+    def __init__(self, old, new, fields):
+        '''
+        constructor
+        '''
+        self._old = old
+        self._new = new
+        self._fields = fields
+
+    @property
+    def old(self):
+        '''
+        the item in the old save buffer
+        '''
+        return self._old
+
+    @property
+    def new(self):
+        '''
+        the item in the new save buffer
+        '''
+        return self._new
+
+    @property
+    def fields(self):
+        '''
+        the changed fields of the item, as a dict of (old, new) value tuples by name. fields
+        that exist on only one side have a value of None on the other.
+        '''
+        return self._fields
+
+
+class SaveDiff:
+    '''
+    the differences between two save buffers
+    '''
+    def __init__(self, added=(), removed=(), changed=(), data=()):
+        '''
+        constructor
+        '''
+        self._added = list(added)
+        self._removed = list(removed)
+        self._changed = list(changed)
+        self._data = list(data)
+
+    @property
+    def added(self):
+        '''
+        the items only present in the new save buffer
+        '''
+        return self._added
+
+    @property
+    def removed(self):
+        '''
+        the items only present in the old save buffer
+        '''
+        return self._removed
+
+    @property
+    def changed(self):
+        '''
+        the items present in both save buffers that differ, as ItemChange instances
+        '''
+        return self._changed
+
+    @property
+    def data(self):
+        '''
+        the differing data outside of the item records, as tuples of the byte ranges in the
+        old and the new save buffer. ranges that are not present on one side are None.
+        '''
+        return self._data
+
+    def __bool__(self):
+        '''
+        indicate whether there are any differences
+        '''
+        return bool(self._added or self._removed or self._changed or self._data)
+
+
+def changed_runs(old, new):
+    '''
+    produce the ranges at which the given bytes-like objects differ as (start, end) tuples.
+    a difference in length is reported as a range reaching to the end of the longer one.
+    '''
+    (old, new) = (memoryview(old).cast('B'), memoryview(new).cast('B'))
+    size = min(len(old), len(new))
+
+    res = []
+    for (start, end) in _differing_blocks(old, new, 0, size, 0):
+        if res and res[-1][1] == start:
+            res[-1] = (res[-1][0], end)
+        else:
+            res.append((start, end))
+
+    if len(old) != len(new):
+        if res and res[-1][1] == size:
+            res[-1] = (res[-1][0], max(len(old), len(new)))
+        else:
+            res.append((size, max(len(old), len(new))))
+    return res
+
+
+def _differing_blocks(old, new, pos, end, level):
+    '''
+    produce the blocks of the given level between pos and end that differ
+    '''
+    step = _BLOCK_SIZES[level]
+    while pos < end:
+        stop = min(pos + step, end)
+        if old[pos:stop] != new[pos:stop]:
+            if level + 1 < len(_BLOCK_SIZES):
+                yield from _differing_blocks(old, new, pos, stop, level + 1)
+            else:
+                yield (pos, stop)
+        pos = stop
+
+
+def _spans(buffer):
+    '''
+    produce the byte ranges of the top-level items of the given buffer, with the name of
+    their container, without constructing the items
+    '''
+    save = SaveFile.from_data(buffer)
+    if save.type == SaveFile.Type.D2S:
+        itemdata = save.itemdata
+        containers = {
+            'player': itemdata.pdata.offsets,
+            'corpse': itemdata.cdata.offsets,
+            'mercenary': itemdata.mdata.offsets,
+            'golem': itemdata.gdata.offsets,
+        }
+    elif save.type == SaveFile.Type.D2I:
+        containers = {'item': [0x06]}
+    else:
+        containers = {f'page {i}': page.offsets for (i, page) in enumerate(save.pages)}
+
+    return [(name, start, start + Item.scan_length(buffer, start))
+            for (name, offsets) in containers.items() for start in offsets]
+
+
+def _dirty(spans, runs, other):
+    '''
+    produce the item records of the given spans that overlap the given differing runs, or
+    that have no identical counterpart in the other spans
+    '''
+    ends = [end for (_, end) in runs]
+    res = []
+    for span in spans:
+        (_, start, end) = span
+        index = bisect.bisect_right(ends, start)
+        if (index < len(runs) and runs[index][0] < end) or span not in other:
+            res.append(span)
+    return res
+
+
+def _key(container, item):
+    '''
+    produce the key by which the given item is aligned with its counterpart
+    '''
+    if isinstance(item, ExtendedItem):
+        return ('uid', item.uid)
+    return (container, item.type, item.location)
+
+
+def _gaps(buffer, spans):
+    '''
+    produce the byte ranges of the given buffer that are not covered by the given items
+    '''
+    spans = sorted((start, end) for (_, start, end) in spans)
+
+    res = []
+    pos = 0
+    for (start, end) in spans + [(len(buffer), len(buffer))]:
+        if start > pos:
+            res.append((pos, start))
+        pos = max(pos, end)
+    return res
+
+
+def _compare_items(old, new):
+    '''
+    produce the differences between the fields of two aligned items, or None if they match
+    '''
+    ((old_container, old), (new_container, new)) = (old, new)
+    if old_container == new_container and old.raw_data == new.raw_data:
+        return None
+
+    (old_fields, new_fields) = (old.fields, new.fields)
+    old_fields['container'] = old_container
+    new_fields['container'] = new_container
+
+    fields = {}
+    for name in itertools.chain(old_fields, (name for name in new_fields
+                                             if name not in old_fields)):
+        values = (old_fields.get(name), new_fields.get(name))
+        if values[0] != values[1]:
+            fields[name] = values
+
+    # the raw data may differ in ways that are not decoded, such as unknown bits
+    return ItemChange(old, new, fields or {'raw_data': (bytes(old.raw_data),
+                                                        bytes(new.raw_data))})
+
+
+def _compare_gaps(old_buffer, old_gaps, new_buffer, new_gaps):
+    '''
+    produce the differing byte ranges of the data around the item records. the gaps are
+    aligned in order, and compared byte-wise if their lengths match.
+    '''
+    res = []
+    for (old, new) in itertools.zip_longest(old_gaps, new_gaps):
+        if old is None or new is None or old[1] - old[0] != new[1] - new[0]:
+            res.append((old, new))
+            continue
+
+        runs = changed_runs(old_buffer.view(*old), new_buffer.view(*new))
+        res.extend(((old[0] + start, old[0] + end), (new[0] + start, new[0] + end))
+                   for (start, end) in runs)
+    return res
+
+
+def diff(old, new):
+    '''
+    compare two save buffers, or bytes-like objects, and produce a SaveDiff. the buffers are
+    only parsed if their data differs, and only the items in differing regions are built.
+    '''
+    (old, new) = (SaveBuffer(old) if not isinstance(old, SaveBuffer) else old,
+                  SaveBuffer(new) if not isinstance(new, SaveBuffer) else new)
+    runs = changed_runs(old.view(0, len(old)), new.view(0, len(new)))
+    if not runs:
+        return SaveDiff()
+
+    # items outside of the differing runs are identical on both sides, if they are found at
+    # the same position in the same container on both sides
+    (old_spans, new_spans) = (_spans(old), _spans(new))
+    (old_dirty, new_dirty) = (_dirty(old_spans, runs, set(new_spans)),
+                              _dirty(new_spans, runs, set(old_spans)))
+    (old_records, new_records) = (
+        [(name, Item.from_data(old, start)) for (name, start, _) in old_dirty],
+        [(name, Item.from_data(new, start)) for (name, start, _) in new_dirty])
+
+    # align the items by key, pairing duplicate keys in order
+    unmatched = collections.defaultdict(collections.deque)
+    for record in old_records:
+        unmatched[_key(*record)].append(record)
+
+    res = SaveDiff()
+    for record in new_records:
+        candidates = unmatched.get(_key(*record))
+        if not candidates:
+            res.added.append(record[1])
+            continue
+
+        change = _compare_items(candidates.popleft(), record)
+        if change is not None:
+            res.changed.append(change)
+
+    res.removed.extend(item for records in unmatched.values() for (_, item) in records)
+    res.data.extend(_compare_gaps(old, _gaps(old, old_spans), new, _gaps(new, new_spans)))
+    return res
@@ -0,0 +1,81 @@
+'''
+this module provides the atomic and optionally asynchronous writing of save files
+'''
+
+import os
+import shutil
+import datetime
+import tempfile
+import functools
+import contextlib
+import concurrent.futures
+
+
+@functools.cache
+def flush_executor():
+    '''
+    produce the thread that writes save files in the background, in the order of requests
+    '''
+    return concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='pyd2s')
+
+
+def completed():
+    '''
+    produce the future of a write that did not need to happen
+    '''
+    future = concurrent.futures.Future()
+    future.set_result(None)
+    return future
+
+
+def replace_file(path, chunks, backup=False):
+    '''
+    atomically replace the file at the given path with the given data, keeping the original
+    file as a timestamped backup if requested
+    '''
+    directory = os.path.dirname(os.path.abspath(path))
+    (handle, temp) = tempfile.mkstemp(
+        prefix=f'.{os.path.basename(path)}.', suffix='.tmp', dir=directory)
+
+    try:
+        with os.fdopen(handle, 'wb') as save:
+            for chunk in chunks:
+                save.write(chunk)
+            save.flush()
+            os.fsync(save.fileno())
+
+        if os.path.exists(path):
+            shutil.copymode(path, temp)
+            if backup:
+                backup_file(path)
+
+        os.replace(temp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(temp)
+        raise
+
+    # make the rename itself durable, where directories can be synced
+    if hasattr(os, 'O_DIRECTORY'):
+        handle = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(handle)
+        finally:
+            os.close(handle)
+
+
+def backup_file(path):
+    '''
+    keep the given file under a name with its modification timestamp. since the file is
+    replaced rather than overwritten, a hard link suffices where it is supported.
+    '''
+    mtime = os.path.getmtime(path)
+    timestamp = datetime.datetime.fromtimestamp(mtime).strftime("%Y%m%d-%H%M%S")
+    target = path + "_" + timestamp
+
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(target)
+    try:
+        os.link(path, target)
+    except OSError:
+        shutil.copy2(path, target)
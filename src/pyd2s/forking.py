@@ -0,0 +1,105 @@
+'''
+this module provides copy-on-write forks of parsed save data
+
+a fork copies the save buffers and, shallowly, the objects that refer to them, re-creating
+their dynamic offsets in the forked buffers. the decoded values held by these objects, as
+well as all objects that do not depend on a buffer, are shared with the original.
+'''
+
+import copy
+import enum
+
+from pyd2s.savebuffer import SaveBuffer
+from pyd2s.itemstat import ItemStat, ItemProperty
+from pyd2s.itemlocation import ItemLocation
+
+# values that never refer to a buffer
+_ATOMIC = (str, bytes, int, float, complex, bool, type(None), enum.Enum, type,
+           ItemStat, ItemProperty, ItemLocation)
+
+# the exact types of the most common of these values
+_PLAIN = {str, int, float, bool, type(None), ItemStat, ItemProperty, ItemLocation}
+
+
+def fork_object(value):
+    '''
+    produce a fork of the given object and everything it refers to that depends on a save
+    buffer
+    '''
+    return _fork(value, {}, None)
+
+
+def _fork(value, memo, buffer):
+    '''
+    produce the fork of the given value, reusing the forks in memo by object id. dynamic
+    offsets are re-created in the given forked buffer of the object that holds them.
+    '''
+    if isinstance(value, _ATOMIC):
+        return value
+
+    key = id(value)
+    if key in memo:
+        return memo[key]
+
+    if isinstance(value, SaveBuffer):
+        res = value.fork()
+    elif isinstance(value, SaveBuffer.DynamicOffset) and buffer is not None:
+        res = buffer.dynamic_offset(int(value))
+    elif isinstance(value, (list, tuple, dict)):
+        return _fork_container(value, memo, buffer)
+    elif type(value).__module__.startswith('pyd2s') and hasattr(value, '__dict__'):
+        return _fork_instance(value, memo, buffer)
+    else:
+        return value
+
+    memo[key] = res
+    return res
+
+
+def _fork_instance(value, memo, buffer):
+    '''
+    produce the fork of the given object, which is the object itself if it does not depend
+    on a buffer
+    '''
+    # pylint: disable=W0212
+    key = id(value)
+    if '_buffer' not in vars(value):
+        # only copy objects that depend on a buffer
+        memo[key] = value
+        attributes = {name: _fork(attr, memo, buffer) for (name, attr) in vars(value).items()}
+        if any(attributes[name] is not attr for (name, attr) in vars(value).items()):
+            res = memo[key] = copy.copy(value)
+            vars(res).update(attributes)
+        return memo[key]
+
+    # objects are registered before their attributes are forked, to resolve cycles
+    res = memo[key] = object.__new__(type(value))
+    attributes = vars(res)
+    buffer = _fork(value._buffer, memo, None)
+    for (name, attr) in vars(value).items():
+        attributes[name] = _fork(attr, memo, buffer)
+    return res
+
+
+def _fork_container(value, memo, buffer):
+    '''
+    produce the fork of the given list, tuple or dict, which is the container itself if none
+    of its elements depend on a buffer
+    '''
+    key = id(value)
+    memo[key] = value
+
+    # containers of plain values, such as the rows of the game data, are shared right away
+    if set(map(type, value.values() if isinstance(value, dict) else value)) <= _PLAIN:
+        return value
+
+    if isinstance(value, dict):
+        elements = {name: _fork(element, memo, buffer) for (name, element) in value.items()}
+        if any(elements[name] is not element for (name, element) in value.items()):
+            memo[key] = elements
+        return memo[key]
+
+    elements = [_fork(element, memo, buffer) for element in value]
+    if any(new is not old for (new, old) in zip(elements, value)):
+        memo[key] = type(value)(elements)
+    return memo[key]
@@ -51,12 +51,22 @@ class _GameData:
         self._tables = {}
         self._expansion = True
 
+        # the functions computing tables from other tables, by table name
+        self._derived = {}
+
     def set_expansion(self, value):
         '''
         set whether we are looking at expansion or classic data files
         '''
         self._expansion = value
 
+    def derive_table(self, table, function):
+        '''
+        register a table that is computed from other tables by the given function, once for
+        each set of data files
+        '''
+        self._derived[table] = function
+
     def __getattr__(self, table):
         '''
         produce a data table for the given key
@@ -69,6 +79,8 @@ class _GameData:
                 self._tables[self._expansion][table] = self._load_strings()
             elif table.endswith('_index'):
                 self._tables[self._expansion][table] = self._load_index_table(table)
+            elif table in self._derived:
+                self._tables[self._expansion][table] = self._derived[table]()
             else:
                 self._tables[self._expansion][table] = self._load_table(table)
 
@@ -13,6 +13,7 @@ from functools import total_ordering
 
 import colorama
 
+from pyd2s.bitfield import BitField
 from pyd2s.gamedata import GameData
 from pyd2s.savebuffer import SaveBuffer
 from pyd2s.character import CharacterClass
@@ -56,24 +57,75 @@ class Item:
     '''
     save data related to a single item
     '''
+    # bit widths of the location, equipped slot, column, row and storage fields at bit 58
+    _LOCATION_FIELDS = (3, 4, 4, 4, 3)
+
+    # the items placed in the sockets of this item, stored right behind it
+    _socketed = ()
+
+    # the item header flags, as bit offsets relative to the start of the item
+    is_identified = BitField(
+        20, 1, bool, writable=True, doc='indicate whether the item is identified')
+    is_socketed = BitField(
+        27, 1, bool, doc='indicate whether the item is socketed')
+    is_newbie = BitField(
+        33, 1, bool, doc='indicate whether the item is a newbie (starter) item')
+    is_ethereal = BitField(
+        38, 1, bool, doc='indicate whether the item is ethereal')
+    is_personalized = BitField(
+        40, 1, bool, doc='indicate whether the item has been personalized by Anya')
+    is_runeword = BitField(
+        42, 1, bool, doc='indicate whether the item is a runeword')
+
     @classmethod
     def from_data(cls, buffer, offset):
         '''
         factory method for dispatching instance creation of various subclasses
         '''
+        return cls._dispatch(buffer, offset)(buffer, offset)
+
+    @classmethod
+    def scan_length(cls, buffer, offset):
+        '''
+        determine the length in bytes of the item at the given offset, including the items
+        socketed in it, without constructing it
+        '''
+        # pylint: disable=W0212
+        return cls._dispatch(buffer, offset)._scan_length(buffer, offset)
+
+    @classmethod
+    def scan_data(cls, buffer, offset):
+        '''
+        produce a view of the raw data of the item at the given offset, including the items
+        socketed in it, without constructing it. this allows copying items between files.
+        '''
+        return buffer.view(offset, offset + cls.scan_length(buffer, offset))
+
+    @staticmethod
+    def _dispatch(buffer, offset):
+        '''
+        determine the subclass of the item at the given offset
+        '''
         if buffer[offset:offset + 2].decode('ascii') != 'JM':
             raise ValueError('invalid save: mismatched item data header')
 
         # is simple?
         if buffer.getbits(offset * 8 + 37, 1):
-            return SimpleItem(buffer, offset)
+            return SimpleItem
 
         # is ear?
         if buffer.getbits(offset * 8 + 32, 1):
-            return EarItem(buffer, offset)
+            return EarItem
 
         # else it's an extended item
-        return ExtendedItem(buffer, offset)
+        return ExtendedItem
+
+    @classmethod
+    def _scan_length(cls, buffer, offset):
+        '''
+        determine the length of the item at the given offset (to be overwritten by subclasses)
+        '''
+        raise NotImplementedError()
 
     def __init__(self, buffer, offset):
         '''
@@ -82,15 +134,18 @@ class Item:
         self._buffer = buffer
         self._offset = buffer.dynamic_offset(offset)
 
+        # decode the fixed header fields once, later reads are served from the cache
+        BitField.decode_all(self)
+
         self._itemdata = GameData.itemdata[self.type]
 
+        ptr = self._buffer.bit_pointer(self._offset * 8 + 58)
+        (location, equipped, column, row, stored) = ptr.read_fields(self._LOCATION_FIELDS)
         self._location = ItemLocation(
-            location=self._buffer.getbits(self._offset * 8 + 58, 3),
-            equipped=self._buffer.getbits(self._offset * 8 + 61, 4),
-            position=(
-                self._buffer.getbits(self._offset * 8 + 65, 4),
-                self._buffer.getbits(self._offset * 8 + 69, 4)),
-            stored=self._buffer.getbits(self._offset * 8 + 73, 3))
+            location=location,
+            equipped=equipped,
+            position=(column, row),
+            stored=stored)
 
         if self._header != 'JM':
             raise ValueError('invalid save: mismatched item data header')
@@ -137,55 +192,6 @@ class Item:
         '''
         return self.name
 
-    @property
-    def is_identified(self):
-        '''
-        indicate whether the item is identified
-        '''
-        return bool(self._buffer.getbits(self._offset * 8 + 20, 1))
-
-    @is_identified.setter
-    def is_identified(self, value):
-        '''
-        set whether the item is identified
-        '''
-        self._buffer.setbits(self._offset * 8 + 20, bool(value), 1)
-
-    @property
-    def is_socketed(self):
-        '''
-        indicate whether the item is socketed
-        '''
-        return bool(self._buffer.getbits(self._offset * 8 + 27, 1))
-
-    @property
-    def is_newbie(self):
-        '''
-        indicate whether the item is a newbie (starter) item
-        '''
-        return bool(self._buffer.getbits(self._offset * 8 + 33, 1))
-
-    @property
-    def is_ethereal(self):
-        '''
-        indicate whether the item is ethereal
-        '''
-        return bool(self._buffer.getbits(self._offset * 8 + 38, 1))
-
-    @property
-    def is_personalized(self):
-        '''
-        indicate whether the item has been personalized by Anya
-        '''
-        return bool(self._buffer.getbits(self._offset * 8 + 40, 1))
-
-    @property
-    def is_runeword(self):
-        '''
-        indicate whether the item is a runeword
-        '''
-        return bool(self._buffer.getbits(self._offset * 8 + 42, 1))
-
     @property
     def location(self):
         '''
@@ -199,13 +205,9 @@ class Item:
         set the location of the item
         '''
         self._location = value
-        raw = value.raw_data
 
-        self._buffer.setbits(self._offset * 8 + 58, raw[0], 3)
-        self._buffer.setbits(self._offset * 8 + 61, raw[1], 4)
-        self._buffer.setbits(self._offset * 8 + 65, raw[2], 4)
-        self._buffer.setbits(self._offset * 8 + 69, raw[3], 4)
-        self._buffer.setbits(self._offset * 8 + 73, raw[4], 3)
+        ptr = self._buffer.bit_pointer(self._offset * 8 + 58)
+        ptr.write_fields(self._LOCATION_FIELDS, value.raw_data)
 
     @property
     def dimensions(self):
@@ -226,7 +228,7 @@ class Item:
         '''
         the raw data of the item
         '''
-        return self._buffer[self._offset:self._offset + self.length]
+        return self._buffer.view(self._offset, self._offset + self.length)
 
     @property
     def length(self):
@@ -235,28 +237,50 @@ class Item:
         '''
         raise NotImplementedError()
 
+    @property
+    def fields(self):
+        '''
+        the decoded fields of the item by name, used to compare items
+        '''
+        return {
+            'type': self.type,
+            'location': self.location,
+            'is_identified': self.is_identified,
+            'is_socketed': self.is_socketed,
+            'is_ethereal': self.is_ethereal,
+            'is_personalized': self.is_personalized,
+            'is_runeword': self.is_runeword,
+        }
+
+    def _relocate(self, buffer, offset):
+        '''
+        point the item and the items socketed in it to the given offset of the given buffer
+        '''
+        # pylint: disable=W0212
+        for item in self._socketed:
+            item._relocate(buffer, offset + (item._offset - self._offset))
+
+        self._buffer.remove_dynamic_offset(self._offset)
+        self._buffer = buffer
+        self._offset = buffer.dynamic_offset(offset)
+
     def detach(self):
         '''
         replace the parent buffer with a new one containing this items rawdata
         '''
-        new_buffer = SaveBuffer(self.raw_data)
-        self._buffer.remove_dynamic_offset(self._offset)
-        self._buffer.remove_bytes(self._offset, self.length)
-        self._buffer = new_buffer
-        self._offset = 0
+        (buffer, offset, length) = (self._buffer, int(self._offset), self.length)
+        self._relocate(SaveBuffer(self.raw_data), 0)
+        buffer.remove_bytes(offset, length)
 
     def attach(self, buffer, offset):
         '''
         attach the item to a new buffer
         '''
-        if self._offset != 0:
+        if int(self._offset) != 0:
             self.detach()
 
-        buffer.insert_bytes(offset, self.length)
-        buffer[offset:offset + self.length] = self.raw_data
-
-        self._buffer = buffer
-        self._offset = self._buffer.dynamic_offset(offset)
+        buffer.insert_bytes(offset, self.raw_data)
+        self._relocate(buffer, offset)
 
     def short_str(self):
         '''
@@ -265,10 +289,59 @@ class Item:
         return self.name
 
 
+def _decode_type(num):
+    '''
+    decode the type code of an item
+    '''
+    return struct.pack('<L', num).decode('ascii').strip()
+
+
+class _ItemBits:
+    '''
+    the bits of an item as a single integer, read from the buffer in growing windows
+    '''
+    # pylint: disable=R0903
+    # the number of bytes read at first, enough for most items
+    WINDOW = 64
+
+    def __init__(self, buffer, offset):
+        '''
+        constructor
+        '''
+        self._buffer = buffer
+        self._offset = offset
+        self._word = 0
+        self._size = 0
+        self._read(self.WINDOW)
+
+    def _read(self, size):
+        '''
+        read the given number of bytes of the item, or as many as the buffer holds
+        '''
+        end = min(len(self._buffer), self._offset + size)
+        self._word = int.from_bytes(self._buffer.view(self._offset, end), 'little')
+        self._size = (end - self._offset) * 8
+
+    def get(self, pos, width):
+        '''
+        produce an integer from the given bit position and length, relative to the item
+        '''
+        while pos + width > self._size:
+            if self._offset + self._size // 8 >= len(self._buffer):
+                raise IndexError('bit range out of buffer bounds')
+            self._read(self._size // 4)
+        return (self._word >> pos) & ((1 << width) - 1)
+
+
 class SimpleItem(Item):
     '''
     save data related to a simple item that is not an ear
     '''
+    type = BitField(
+        76, 32, _decode_type, doc='the type of the item')
+    num_socketed = BitField(
+        108, 3, doc='the number of filled sockets')
+
     def __init__(self, buffer, offset):
         '''
         constructor
@@ -291,14 +364,6 @@ class SimpleItem(Item):
                 for mod_type in GemApplyType
             }
 
-    @property
-    def type(self):
-        '''
-        the type of the item
-        '''
-        num = self._buffer.getbits(self._offset * 8 + 76, 32)
-        return struct.pack('<L', num).decode('ascii').strip()
-
     @property
     def item_types(self):
         '''
@@ -318,12 +383,12 @@ class SimpleItem(Item):
 
         return types
 
-    @property
-    def num_socketed(self):
+    @classmethod
+    def _scan_length(cls, buffer, offset):
         '''
-        the number of filled sockets
+        determine the length of the item at the given offset
         '''
-        return self._buffer.getbits(self._offset * 8 + 108, 3)
+        return 14
 
     @property
     def length(self):
@@ -378,12 +443,25 @@ class EarItem(Item):
     '''
     save data related to an ear
     '''
+    character_class = BitField(
+        76, 3, CharacterClass, doc='the character class of the ear')
+    character_level = BitField(
+        79, 3, doc='the character level of the ear')
+
     def __init__(self, buffer, offset):
         '''
         constructor
         '''
         super().__init__(buffer, offset)
-        self._length = math.ceil((86 + (len(self.character_name) + 1) * 7) / 8)
+        self._length = self._scan_length(buffer, offset)
+
+    @classmethod
+    def _scan_length(cls, buffer, offset):
+        '''
+        determine the length of the item at the given offset
+        '''
+        name = buffer.bit_pointer(offset * 8 + 86).read_string()
+        return math.ceil((86 + (len(name) + 1) * 7) / 8)
 
     @property
     def name(self):
@@ -406,20 +484,6 @@ class EarItem(Item):
         '''
         return self.name
 
-    @property
-    def character_class(self):
-        '''
-        the character class of the ear
-        '''
-        return CharacterClass(self._buffer.getbits(self._offset * 8 + 76, 3))
-
-    @property
-    def character_level(self):
-        '''
-        the character level of the ear
-        '''
-        return self._buffer.getbits(self._offset * 8 + 79, 3)
-
     @property
     def character_name(self):
         '''
@@ -435,6 +499,17 @@ class EarItem(Item):
         '''
         return self._length
 
+    @property
+    def fields(self):
+        '''
+        the decoded fields of the item by name, used to compare items
+        '''
+        return super().fields | {
+            'character_name': self.character_name,
+            'character_class': self.character_class,
+            'character_level': self.character_level,
+        }
+
     def __str__(self):
         '''
         a string representation of the item
@@ -451,6 +526,22 @@ class ExtendedItem(SimpleItem):
     '''
     save data related to an extended item
     '''
+    uid = BitField(
+        111, 32, doc='the unique id of the item')
+    ilvl = BitField(
+        143, 7, doc='the item level')
+    quality = BitField(
+        150, 4, ItemQuality, doc='the item quality')
+
+    # the bit widths of the quality specific details, except for rare and crafted items
+    _QUALITY_DETAILS = {
+        ItemQuality.LOW_QUALITY: 3,
+        ItemQuality.HIGH_QUALITY: 3,
+        ItemQuality.MAGICAL: 22,
+        ItemQuality.SET: 12,
+        ItemQuality.UNIQUE: 12,
+    }
+
     def __init__(self, buffer, offset):
         # it makes little sense to split this method up, it's most concise this way
         # pylint: disable=R0912, R0915
@@ -461,7 +552,9 @@ class ExtendedItem(SimpleItem):
 
         self._attributes = {}
 
+        # the fixed extended header fields are decoded already, continue behind them
         ptr = buffer.bit_pointer(self._offset * 8 + 154)
+        quality = self.quality
 
         # icon select
         if ptr.read(1):
@@ -472,24 +565,24 @@ class ExtendedItem(SimpleItem):
             self._attributes['class_affix'] = ptr.read(11)
 
         # low quality details
-        if self.quality == ItemQuality.LOW_QUALITY:
+        if quality == ItemQuality.LOW_QUALITY:
             self._attributes['lq_affix'] = ptr.read(3)
 
         # high quality details
-        if self.quality == ItemQuality.HIGH_QUALITY:
+        if quality == ItemQuality.HIGH_QUALITY:
             self._attributes['hq_affix'] = ptr.read(3)
 
         # magic item details
-        if self.quality == ItemQuality.MAGICAL:
+        if quality == ItemQuality.MAGICAL:
             self._attributes['magic_prefix'] = ptr.read(11)
             self._attributes['magic_suffix'] = ptr.read(11)
 
         # set item details part 1
-        if self.quality == ItemQuality.SET:
+        if quality == ItemQuality.SET:
             self._attributes['set_id'] = ptr.read(12)
 
         # rare item details
-        if self.quality == ItemQuality.RARE:
+        if quality == ItemQuality.RARE:
             self._attributes['rare_name_1'] = ptr.read(8)
             self._attributes['rare_name_2'] = ptr.read(8)
 
@@ -500,11 +593,11 @@ class ExtendedItem(SimpleItem):
                     self._attributes[f'rare_suffix_{i}'] = ptr.read(11)
 
         # unique item details
-        if self.quality == ItemQuality.UNIQUE:
+        if quality == ItemQuality.UNIQUE:
             self._attributes['unique_id'] = ptr.read(12)
 
         # crafted item details
-        if self.quality == ItemQuality.CRAFTED:
+        if quality == ItemQuality.CRAFTED:
             self._attributes['crafted_name_1'] = ptr.read(8)
             self._attributes['crafted_name_2'] = ptr.read(8)
 
@@ -551,14 +644,14 @@ class ExtendedItem(SimpleItem):
             self._attributes['socket_count'] = ptr.read(4)
 
         # set details part 2
-        if self.quality == ItemQuality.SET:
+        if quality == ItemQuality.SET:
             set_properties = ptr.read(5)
 
         # the first attribute list are regular affixes and modifiers
         self._attributes['enhancements'] = ItemStat.read_list(ptr)
 
         # set items have one or two extra modifier lists
-        if self.quality == ItemQuality.SET:
+        if quality == ItemQuality.SET:
             if set_properties >= 1:
                 self._attributes['set_enhancements_1'] = ItemStat.read_list(ptr)
             if set_properties >= 3:
@@ -587,6 +680,75 @@ class ExtendedItem(SimpleItem):
         # mark the length of the item in bytes
         self._length = length
 
+    @classmethod
+    def _scan_length(cls, buffer, offset):
+        # this follows the layout decoded by the constructor, so it is just as long
+        # pylint: disable=R0912
+        '''
+        determine the length of the item at the given offset. the fields and stat lists that
+        the constructor decodes are skipped by their bit widths, without decoding them.
+        '''
+        get = _ItemBits(buffer, int(offset)).get
+        itemdata = GameData.itemdata[_decode_type(get(76, 32))]
+        quality = ItemQuality(get(150, 4))
+        pos = 154
+
+        # icon select and class item affix
+        pos += 1 + 3 * get(pos, 1)
+        pos += 1 + 11 * get(pos, 1)
+
+        # quality specific details, with optional affixes for rare and crafted items
+        if quality in (ItemQuality.RARE, ItemQuality.CRAFTED):
+            pos += 16
+            for _ in range(6):
+                pos += 1 + 11 * get(pos, 1)
+        else:
+            pos += cls._QUALITY_DETAILS.get(quality, 0)
+
+        is_runeword = get(cls.is_runeword.offset, 1)
+        if is_runeword:
+            pos += 16
+        if get(cls.is_personalized.offset, 1):
+            while get(pos, 7):
+                pos += 7
+            pos += 7
+        if itemdata['type'] == 'book':
+            pos += 5
+        pos += 1
+
+        if itemdata['kind'] == 'armor':
+            pos += 11
+        if itemdata['kind'] in ['armor', 'weapons']:
+            pos += 8 + (9 if get(pos, 8) else 0)
+        if itemdata.get('stackable', 0) == '1':
+            pos += 9
+        if get(cls.is_socketed.offset, 1):
+            pos += 4
+
+        # the regular, set and rune word stat lists
+        lists = 1 + is_runeword
+        if quality == ItemQuality.SET:
+            set_properties = get(pos, 5)
+            pos += 5
+            lists += (set_properties >= 1) + (set_properties >= 3)
+
+        # each stat is followed implicitly by the blocks of its consecutive stats
+        decoders = GameData.itemstat_decoders
+        for _ in range(lists):
+            while True:
+                eid = get(pos, 9)
+                pos += 9
+                if eid == 0x1FF:
+                    break
+                for (param_bits, value_bits, _, _, _) in decoders[eid:eid + decoders[eid][3]]:
+                    pos += param_bits + value_bits
+
+        # round the item length up to the nearest byte, and add the socketed items
+        length = (pos - 1) // 8 + 1
+        for _ in range(get(cls.num_socketed.offset, 3)):
+            length += Item.scan_length(buffer, offset + length)
+        return length
+
     @property
     def required_level(self):
         '''
@@ -717,32 +879,37 @@ class ExtendedItem(SimpleItem):
         return colorama.Fore.WHITE
 
     @property
-    def uid(self):
+    def length(self):
         '''
-        the unique id of the item
+        the length of the item in bytes
         '''
-        return self._buffer.getbits(self._offset * 8 + 111, 32)
+        return self._length
 
     @property
-    def ilvl(self):
+    def fields(self):
         '''
-        the item level
+        the decoded fields of the item by name, used to compare items. stats are summed up
+        per stat list, stat and param.
         '''
-        return self._buffer.getbits(self._offset * 8 + 143, 7)
+        res = super().fields | {
+            'uid': self.uid,
+            'ilvl': self.ilvl,
+            'quality': self.quality,
+            'socketed': tuple(item.type for item in self._socketed),
+        }
 
-    @property
-    def quality(self):
-        '''
-        the item quality
-        '''
-        return ItemQuality(self._buffer.getbits(self._offset * 8 + 150, 4))
+        for (key, value) in self._attributes.items():
+            if not isinstance(value, list):
+                res[key] = value
+                continue
 
-    @property
-    def length(self):
-        '''
-        the length of the item in bytes
-        '''
-        return self._length
+            for stat in (stat for group in value for stat in (group, *group.children)):
+                name = f'{key}.{stat.stat}'
+                if stat.has_param:
+                    name += f'[{stat.param}]'
+                res[name] = res.get(name, 0) + stat.value
+
+        return res
 
     def _apply_mods(self, value, stat):
         '''
@@ -3,9 +3,126 @@
 this module provides classes to manage item data of a d2s save
 '''
 
-import struct
+import collections.abc
 
 from pyd2s.item import Item
+from pyd2s.savebuffer import SaveBuffer
+
+
+class ItemList(collections.abc.MutableSequence):
+    '''
+    a list of the items at the given offsets of a save buffer. the items are constructed when
+    they are first accessed, until then only their offsets are kept.
+    '''
+    def __init__(self, buffer, offsets=()):
+        '''
+        constructor
+        '''
+        self._buffer = buffer
+        # the constructed items, and the dynamic offsets of those not yet constructed
+        self._items = [buffer.dynamic_offset(offset) for offset in offsets]
+
+    def _get(self, index):
+        '''
+        produce the item at the given index, constructing it if necessary
+        '''
+        item = self._items[index]
+        if isinstance(item, SaveBuffer.DynamicOffset):
+            self._items[index] = Item.from_data(self._buffer, int(item))
+            self._buffer.remove_dynamic_offset(item)
+        return self._items[index]
+
+    def _release(self, items):
+        '''
+        stop tracking the offsets of the given items that were not constructed
+        '''
+        for item in items:
+            if isinstance(item, SaveBuffer.DynamicOffset):
+                self._buffer.remove_dynamic_offset(item)
+
+    @property
+    def constructed(self):
+        '''
+        the number of items that have been constructed
+        '''
+        return sum(not isinstance(item, SaveBuffer.DynamicOffset) for item in self._items)
+
+    @property
+    def offsets(self):
+        '''
+        the start offsets of the items, without constructing them
+        '''
+        # pylint: disable=W0212
+        return [int(item if isinstance(item, SaveBuffer.DynamicOffset) else item._offset)
+                for item in self._items]
+
+    def __len__(self):
+        '''
+        the number of items
+        '''
+        return len(self._items)
+
+    def __getitem__(self, index):
+        '''
+        produce the item at the given index, or a list of the items in the given slice
+        '''
+        if isinstance(index, slice):
+            return [self._get(i) for i in range(*index.indices(len(self._items)))]
+        return self._get(index)
+
+    def __setitem__(self, index, value):
+        '''
+        replace the item at the given index, or the items in the given slice
+        '''
+        replaced = self._items[index]
+        self._items[index] = value
+        self._release(replaced if isinstance(index, slice) else [replaced])
+
+    def __delitem__(self, index):
+        '''
+        remove the item at the given index, or the items in the given slice
+        '''
+        removed = self._items[index]
+        del self._items[index]
+        self._release(removed if isinstance(index, slice) else [removed])
+
+    def insert(self, index, value):
+        '''
+        insert an item before the given index
+        '''
+        self._items.insert(index, value)
+
+    def append_offset(self, offset):
+        '''
+        append the item at the given offset, to be constructed when it is first accessed
+        '''
+        self._items.append(self._buffer.dynamic_offset(offset))
+
+    def __eq__(self, other):
+        '''
+        compare the items with those of another sequence
+        '''
+        if not isinstance(other, collections.abc.Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __add__(self, other):
+        '''
+        concatenate the items with those of another sequence into a list
+        '''
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        '''
+        concatenate the items of another sequence with these into a list
+        '''
+        return list(other) + list(self)
+
+    def __repr__(self):
+        '''
+        a string representation of the list
+        '''
+        return f'ItemList({list(self)!r})'
 
 
 class ItemData:
@@ -21,13 +138,13 @@ class ItemData:
         self._offset = buffer.dynamic_offset(offset)
 
         # items on player / belt / cursor / in stash
-        self._pdata = []
+        self._pdata = ItemList(buffer)
         # items on player corpse, if any
-        self._cdata = []
+        self._cdata = ItemList(buffer)
         # items on mercenary, if any
-        self._mdata = []
+        self._mdata = ItemList(buffer)
         # iron golem
-        self._gdata = []
+        self._gdata = ItemList(buffer)
 
         if self._header != 'JM':
             raise ValueError('invalid save: mismatched item data section header')
@@ -38,6 +155,7 @@ class ItemData:
 
         ptr = self._offset + 2
 
+        # only the boundaries of the items are scanned, they are constructed on access
         ptr = self._read_pdata(ptr)
         ptr = self._read_cdata(ptr)
         ptr = self._read_mdata(ptr)
@@ -50,15 +168,10 @@ class ItemData:
         '''
         parse player item data from the save buffer
         '''
-        pcount = struct.unpack_from('<H', self._buffer, ptr)[0]
+        pcount = self._buffer.unpack_from('<H', ptr)[0]
         ptr += 2
 
-        for _ in range(pcount):
-            item = Item.from_data(self._buffer, ptr)
-            ptr += item.length
-            self._pdata.append(item)
-
-        return ptr
+        return self._scan_items(self._pdata, ptr, pcount)
 
     def _read_cdata(self, ptr):
         '''
@@ -68,7 +181,7 @@ class ItemData:
             raise ValueError('invalid save: mismatched corpse item data section header')
         ptr += 2
 
-        ccount = struct.unpack_from('<H', self._buffer, ptr)[0]
+        ccount = self._buffer.unpack_from('<H', ptr)[0]
         ptr += 2
 
         if ccount == 0:
@@ -80,15 +193,10 @@ class ItemData:
             raise ValueError('invalid save: mismatched corpse item data section header')
         ptr += 2
 
-        ccount = struct.unpack_from('<H', self._buffer, ptr)[0]
+        ccount = self._buffer.unpack_from('<H', ptr)[0]
         ptr += 2
 
-        for _ in range(ccount):
-            item = Item.from_data(self._buffer, ptr)
-            ptr += item.length
-            self._cdata.append(item)
-
-        return ptr
+        return self._scan_items(self._cdata, ptr, ccount)
 
     def _read_mdata(self, ptr):
         '''
@@ -109,13 +217,10 @@ class ItemData:
             raise ValueError('invalid save: mismatched mercenary item data section header')
         ptr += 2
 
-        mcount = struct.unpack_from('<H', self._buffer, ptr)[0]
+        mcount = self._buffer.unpack_from('<H', ptr)[0]
         ptr += 2
 
-        for _ in range(mcount):
-            item = Item.from_data(self._buffer, ptr)
-            ptr += item.length
-            self._mdata.append(item)
+        ptr = self._scan_items(self._mdata, ptr, mcount)
 
         if self._buffer[ptr:ptr+2].decode('ascii') != 'kf':
             raise ValueError('invalid save: mismatched mercenary item data section header')
@@ -130,10 +235,16 @@ class ItemData:
         gcount = self._buffer[ptr]
         ptr += 1
 
-        if gcount == 1:
-            item = Item.from_data(self._buffer, ptr)
-            ptr += item.length
-            self._gdata.append(item)
+        return self._scan_items(self._gdata, ptr, 1 if gcount == 1 else 0)
+
+    def _scan_items(self, items, ptr, count):
+        '''
+        scan the boundaries of the given number of items, and set up the given item list with
+        their offsets
+        '''
+        for _ in range(count):
+            items.append_offset(ptr)
+            ptr += Item.scan_length(self._buffer, ptr)
 
         return ptr
 
@@ -0,0 +1,173 @@
+'''
+this module provides a batch decoder of the fixed item header fields
+
+the location, type, unique id, item level and quality of an item are stored at fixed bit
+offsets relative to its start, so they can be decoded for many items at once without
+constructing them. with numpy, the first bytes of all items are gathered into a matrix and
+the fields are extracted with vectorized bit operations, otherwise the items are decoded one
+at a time. only the fields of top-level items are decoded, not those of socketed items.
+'''
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+from pyd2s import SaveFile
+from pyd2s.savebuffer import SaveBuffer
+
+# the number of bytes covering the fixed header of extended items
+HEADER_SIZE = 20
+
+# the decoded fields, as bit offsets and widths relative to the start of the item
+_FIELDS = {
+    'location': (58, 3),
+    'equipped': (61, 4),
+    'column': (65, 4),
+    'row': (69, 4),
+    'stored': (73, 3),
+    'type': (76, 32),
+    'uid': (111, 32),
+    'ilvl': (143, 7),
+    'quality': (150, 4),
+}
+
+# the fields that are only present in extended items, and zero for all others
+_EXTENDED_FIELDS = ('uid', 'ilvl', 'quality')
+
+# the bits indicating simple items and ears
+_SIMPLE_BIT = 37
+_EAR_BIT = 32
+
+
+def item_offsets(save):
+    '''
+    produce the start offsets of the top-level items of the given save file, without
+    constructing them
+    '''
+    if save.type == SaveFile.Type.D2S:
+        itemdata = save.itemdata
+        return [offset for items in (itemdata.pdata, itemdata.cdata, itemdata.mdata,
+                                     itemdata.gdata) for offset in items.offsets]
+    if save.type == SaveFile.Type.D2I:
+        return [0x06]
+    return [offset for page in save.pages for offset in page.offsets]
+
+
+def decode_headers(sources):
+    '''
+    decode the fixed header fields of many items at once. each source is a save file, whose
+    top-level items are decoded, or a tuple of a save buffer or bytes-like object and the
+    start offsets of the items in it.
+
+    the result is a dict of the columns 'source', the index of the source of each item,
+    'offset', 'extended', 'location', 'equipped', 'column', 'row', 'stored', 'type', 'uid',
+    'ilvl' and 'quality', as numpy arrays if numpy is available, and as lists otherwise.
+    the location and quality are given as the values of ItemLocation.LocationType and
+    ItemQuality, and uid, ilvl and quality are zero for items that are not extended.
+    '''
+    columns = []
+    for (index, source) in enumerate(sources):
+        if isinstance(source, SaveFile):
+            # pylint: disable=W0212
+            source = (source._buffer, item_offsets(source))
+        (data, offsets) = source
+
+        view = data.view(0, len(data)) if isinstance(data, SaveBuffer) else memoryview(data)
+        with view:
+            if numpy is None:
+                columns.append(_decode_loop(index, view, offsets))
+            else:
+                columns.append(_decode_vectorized(index, view, offsets))
+
+    if numpy is None:
+        return {name: [value for column in columns for value in column[name]]
+                for name in _columns()}
+    if not columns:
+        return {name: numpy.zeros(0, dtype=numpy.int64) for name in _columns()}
+    return {name: numpy.concatenate([column[name] for column in columns])
+            for name in _columns()}
+
+
+def _columns():
+    '''
+    produce the names of the result columns in order
+    '''
+    return ('source', 'offset', 'extended', *_FIELDS)
+
+
+def _decode_type(num, is_ear):
+    '''
+    decode the type code of an item
+    '''
+    if is_ear:
+        return 'ear'
+    return num.to_bytes(4, 'little').decode('ascii').strip()
+
+
+def _decode_loop(index, view, offsets):
+    '''
+    decode the header fields of the items at the given offsets one at a time
+    '''
+    res = {name: [] for name in _columns()}
+    for offset in map(int, offsets):
+        word = int.from_bytes(view[offset:offset + HEADER_SIZE], 'little')
+        is_ear = bool(word >> _EAR_BIT & 1)
+        extended = not word >> _SIMPLE_BIT & 1 and not is_ear
+
+        res['source'].append(index)
+        res['offset'].append(offset)
+        res['extended'].append(extended)
+        for (name, (start, width)) in _FIELDS.items():
+            value = word >> start & ((1 << width) - 1)
+            if name in _EXTENDED_FIELDS and not extended:
+                value = 0
+            elif name == 'type':
+                value = _decode_type(value, is_ear)
+            res[name].append(value)
+    return res
+
+
+def _extract(matrix, start, width):
+    '''
+    extract the bit field at the given bit offset and width from all rows of the matrix of
+    item header bytes
+    '''
+    (first, shift) = divmod(start, 8)
+    word = numpy.zeros(len(matrix), dtype=numpy.uint64)
+    for i in range((shift + width + 7) // 8):
+        word |= matrix[:, first + i].astype(numpy.uint64) << numpy.uint64(8 * i)
+    return (word >> numpy.uint64(shift)) & numpy.uint64((1 << width) - 1)
+
+
+def _decode_vectorized(index, view, offsets):
+    '''
+    decode the header fields of the items at the given offsets with vectorized operations
+    '''
+    offsets = numpy.asarray([int(offset) for offset in offsets], dtype=numpy.int64)
+
+    # pad the data, so the headers of short items at its end can be gathered
+    data = numpy.zeros(len(view) + HEADER_SIZE, dtype=numpy.uint8)
+    data[:len(view)] = numpy.frombuffer(view, dtype=numpy.uint8)
+    matrix = data[offsets[:, None] + numpy.arange(HEADER_SIZE)]
+
+    is_ear = _extract(matrix, _EAR_BIT, 1).astype(bool)
+    extended = ~_extract(matrix, _SIMPLE_BIT, 1).astype(bool) & ~is_ear
+
+    res = {
+        'source': numpy.full(len(offsets), index, dtype=numpy.int64),
+        'offset': offsets,
+        'extended': extended,
+    }
+    for (name, (start, width)) in _FIELDS.items():
+        value = _extract(matrix, start, width).astype(numpy.int64)
+        if name in _EXTENDED_FIELDS:
+            value[~extended] = 0
+        res[name] = value
+
+    # the type codes are four ascii characters, padded with spaces
+    codes = res['type'].astype('<u4').view('S4')
+    types = numpy.char.strip(codes).astype('U4')
+    types[is_ear] = 'ear'
+    res['type'] = types
+    return res
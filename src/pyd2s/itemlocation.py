@@ -224,6 +224,20 @@ class ItemLocation:
             self._pos[1] if self._pos else 0,
             self._stored.value if self._stored else 0)
 
+    def __eq__(self, other):
+        '''
+        compare two locations by their raw data fields
+        '''
+        if self.__class__ is other.__class__:
+            return self.raw_data == other.raw_data
+        return NotImplemented
+
+    def __hash__(self):
+        '''
+        hash the location by its raw data fields
+        '''
+        return hash(self.raw_data)
+
     def __str__(self):
         '''
         string representation
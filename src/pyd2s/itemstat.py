@@ -70,44 +70,116 @@ STAT_GROUPS_INDEX = {
 }
 
 
+def _load_stat_decoders():
+    '''
+    compute the decoder of each stat id, as a tuple of the param and value bit widths, the
+    value offset, the number of consecutive blocks and the ids of the stats in its group
+    '''
+    groups = {
+        id(group): frozenset(
+            int(GameData.itemstatcost_index[stat]['ID']) for stat in group['dgrp'])
+        for group in STAT_GROUPS
+    }
+
+    res = []
+    for (eid, item_stat_cost) in enumerate(GameData.itemstatcost):
+        group = STAT_GROUPS_INDEX.get(item_stat_cost['Stat'])
+        res.append((
+            int(item_stat_cost['Save Param Bits'] or 0),
+            int(item_stat_cost['Save Bits'] or 0),
+            int(item_stat_cost['Save Add'] or 0),
+            GameData.get_consecutive_item_stat_blocks(eid),
+            groups[id(group)] if group is not None else None,
+        ))
+    return res
+
+
+GameData.derive_table('itemstat_decoders', _load_stat_decoders)
+
+
+class ItemStatType:
+    '''
+    the static data of a stat id, shared by all item stats with that id
+    '''
+    # pylint: disable=R0903
+    __slots__ = ('row', 'stat', 'stat_id', 'has_param', 'op', 'op_param', 'priority')
+
+    def __init__(self, row):
+        '''
+        constructor
+        '''
+        self.row = row
+        self.stat = row['Stat']
+        self.stat_id = int(row['ID'])
+        self.has_param = bool(int(row['Save Param Bits'] or 0))
+        self.op = int(row['op'] or 0)
+        self.op_param = int(row['op param'] or 0)
+        self.priority = int(row['descpriority'] or 0)
+
+
+GameData.derive_table(
+    'itemstat_types', lambda: [ItemStatType(row) for row in GameData.itemstatcost])
+
+
 class ItemStat:
     '''
-    a magical item enhancement
+    a magical item enhancement. the static data of the stat is shared between instances.
     '''
+    __slots__ = ('_type', '_param', '_value', '_children')
+
     @classmethod
     def read_list(cls, ptr):
         '''
         read a list of ItemStat instances from a SaveBuffer pointer
         '''
-        res = []
+        decoders = GameData.itemstat_decoders
 
+        stats = []
         while True:
             eid = ptr.read(9)
             if eid == 0x1FF:
                 break
 
             # some item stats expect more data blocks without explicit eid's
-            consecutive = GameData.get_consecutive_item_stat_blocks(eid)
-
-            group = []
-            for _eid in range(eid, eid + consecutive):
-                item_stat_cost = GameData.itemstatcost[_eid]
+            head = None
+            for _eid in range(eid, eid + decoders[eid][3]):
+                (param_bits, value_bits, add, _, _) = decoders[_eid]
+                (param, value) = ptr.read_fields((param_bits, value_bits))
+                stat = ItemStat(_eid, param, value - add)
+                if head is None:
+                    head = stat
+                else:
+                    head.add_child(stat)
 
-                field_width = int(item_stat_cost['Save Param Bits'] or 0)
-                param = ptr.read(field_width)
+            stats.append((eid, head))
 
-                field_width = int(item_stat_cost['Save Bits'] or 0)
-                value = ptr.read(field_width)
-                value -= int(item_stat_cost['Save Add'] or 0)
+        return cls._group_by_id(stats, decoders)
 
-                group.append(ItemStat(_eid, param, value))
+    @staticmethod
+    def _group_by_id(stats, decoders):
+        '''
+        reduce the list of (stat id, ItemStat) tuples into groups like group_reduce, by the
+        stat ids of the groups in the given decoders
+        '''
+        res = []
+        i = 0
+        while i < len(stats):
+            (eid, stat) = stats[i]
+            i += 1
 
-            for child in group[1:]:
-                group[0].add_child(child)
+            group = decoders[eid][4]
+            if group is not None:
+                end = i
+                while end < len(stats) and stats[end][0] in group:
+                    end += 1
+                if group == {eid, *(other for (other, _) in stats[i:end])}:
+                    for (_, other) in stats[i:end]:
+                        stat.add_child(other)
+                    i = end
 
-            res.append(group[0])
+            res.append(stat)
 
-        return list(cls.group_reduce(res))
+        return res
 
     @classmethod
     def group_reduce(cls, iterable):
@@ -129,9 +201,8 @@ class ItemStat:
         constructor
         '''
         if isinstance(code, str):
-            self._itemstat = GameData.itemstatcost_index[code]
-        else:
-            self._itemstat = GameData.itemstatcost[code]
+            code = int(GameData.itemstatcost_index[code]['ID'])
+        self._type = GameData.itemstat_types[code]
 
         # if we don't have a param, use the value instead. this is useful in cases
         # where mods and properties follow differnt conventions for encoding values
@@ -139,37 +210,36 @@ class ItemStat:
         self._param = param if param else value
         self._value = value
 
-        self._children = []
+        self._children = ()
+
+    @property
+    def _itemstat(self):
+        '''
+        the row of the stat in itemstatcost
+        '''
+        return self._type.row
 
     @property
     def stat(self):
         '''
         the string id of the stat
         '''
-        return self._itemstat['Stat']
+        return self._type.stat
 
     @property
     def stat_id(self):
         '''
         the numerical id of the stat
         '''
-        return int(self._itemstat['ID'])
+        return self._type.stat_id
 
     @property
     def value(self):
         '''
         the value of the stat
         '''
-        if self._itemstat['op']:
-            # little benefit to deviate from the original names just to placate pylint
-            # pylint: disable=C0103
-            op = int(self._itemstat['op'] or 0)
-            op_param = int(self._itemstat['op param'] or 0)
-
-            logging.debug(self._itemstat)
-
-            if op in [2, 4]:
-                return self._value / (2 ** op_param)
+        if self._type.op in [2, 4]:
+            return self._value / (2 ** self._type.op_param)
 
         return self._value
 
@@ -187,6 +257,20 @@ class ItemStat:
         '''
         return self._param
 
+    @property
+    def has_param(self):
+        '''
+        indicate whether the stat is saved with a param
+        '''
+        return self._type.has_param
+
+    @property
+    def children(self):
+        '''
+        the stats grouped with this one
+        '''
+        return self._children
+
     @property
     def applies_to(self):
         '''
@@ -206,7 +290,7 @@ class ItemStat:
         '''
         # little benefit to deviate from the original names just to placate pylint
         # pylint: disable=C0103
-        op = int(self._itemstat['op'] or 0)
+        op = self._type.op
 
         if op == 0:
             return self.value
@@ -222,7 +306,7 @@ class ItemStat:
         '''
         add a child property
         '''
-        self._children.append(child)
+        self._children += (child, )
 
     def group_with(self, others):
         '''
@@ -259,8 +343,7 @@ class ItemStat:
                 self_skill = GameData.skills[self.param]
                 other_skill = GameData.skills[other.param]
                 return int(self_skill['Id']) < int(other_skill['Id'])
-            return (int(self._itemstat['descpriority'] or 0)
-                    < int(other._itemstat['descpriority'] or 0))
+            return self._type.priority < other._type.priority
         return NotImplemented
 
     def __str__(self):
@@ -531,6 +614,8 @@ class ItemProperty:
     '''
     a property on a socketable item
     '''
+    __slots__ = ('_code', '_param', '_min_value', '_max_value', '_property', '_itemstat')
+
     def __init__(self, code, param, min_value, max_value):
         '''
         constructor
@@ -0,0 +1,186 @@
+'''
+this module provides an undo journal of the modifications of save buffers
+'''
+
+import logging
+import collections
+
+
+class Journal:
+    '''
+    a bounded record of the modifications of a save buffer, that can be undone and redone.
+
+    bit writes are recorded as the bit range with its old and new value, all other writes,
+    insertions and removals as the byte span that was replaced, with its old and new bytes.
+    entries are grouped into steps at checkpoints, and undo and redo work a step at a time.
+    the oldest steps are dropped once the recorded data exceeds the size limit. if a single
+    step exceeds it, the journal is truncated: all steps are dropped, and the modifications
+    up to the next checkpoint are not recorded.
+
+    parsed objects are not updated by undo and redo, their data needs to be parsed again.
+    '''
+    # pylint: disable=R0902
+    # the default limit of the recorded data in bytes
+    MAX_SIZE = 1 << 20
+
+    def __init__(self, buffer, max_size=MAX_SIZE):
+        '''
+        constructor
+        '''
+        self._buffer = buffer
+        self._max_size = max_size
+        self._size = 0
+
+        # the closed steps that can be undone, and those that can be redone
+        self._undo = collections.deque()
+        self._redo = []
+        # the entries since the last checkpoint
+        self._step = []
+
+        self._replaying = False
+        # whether entries are ignored until the next checkpoint
+        self._truncated = False
+
+    @staticmethod
+    def _entry_size(entry):
+        '''
+        the approximate memory size of an entry in bytes
+        '''
+        if entry[0] == 'bits':
+            return 16 + entry[2] // 4
+        return 16 + len(entry[2]) + len(entry[3])
+
+    def _record(self, entry):
+        '''
+        add an entry to the current step, dropping the oldest steps if the size limit is
+        exceeded
+        '''
+        if self._replaying or self._truncated:
+            return
+
+        if self._redo:
+            self._size -= sum(self._entry_size(entry) for step in self._redo for entry in step)
+            self._redo.clear()
+
+        self._step.append(entry)
+        self._size += self._entry_size(entry)
+
+        while self._size > self._max_size and self._undo:
+            self._size -= sum(self._entry_size(entry) for entry in self._undo.popleft())
+        if self._size > self._max_size:
+            # the step can not be undone, and the earlier steps no longer apply without it
+            logging.debug('Journal:truncating at a step exceeding the size limit')
+            self._step.clear()
+            self._size = 0
+            self._truncated = True
+
+    def bits(self, start, length, old, new):
+        '''
+        record that the given bits changed from old to new
+        '''
+        self._record(('bits', start, length, old, new))
+
+    def splice(self, start, old, new):
+        '''
+        record that the given old bytes at start were replaced by the given new bytes
+        '''
+        self._record(('bytes', start, bytes(old), bytes(new)))
+
+    def checkpoint(self):
+        '''
+        close the current step, squashing repeated writes to the same location and writes
+        that did not change anything
+        '''
+        self._truncated = False
+        if not self._step:
+            return
+
+        squashed = []
+        for entry in self._step:
+            previous = squashed[-1] if squashed else (None, None, None, None)
+            if entry[0] == 'bits' and previous[:3] == entry[:3]:
+                squashed[-1] = (*previous[:4], entry[4])
+            elif (entry[0] == 'bytes' and previous[:2] == entry[:2]
+                  and len(previous[3]) == len(entry[2]) == len(entry[3])):
+                squashed[-1] = (*previous[:3], entry[3])
+            else:
+                squashed.append(entry)
+
+            if squashed[-1][-2] == squashed[-1][-1]:
+                squashed.pop()
+
+        self._size -= sum(self._entry_size(entry) for entry in self._step)
+        self._size += sum(self._entry_size(entry) for entry in squashed)
+        self._step = []
+        if squashed:
+            self._undo.append(squashed)
+
+    @property
+    def can_undo(self):
+        '''
+        indicate whether there is a step to undo
+        '''
+        return bool(self._step or self._undo)
+
+    @property
+    def can_redo(self):
+        '''
+        indicate whether there is a step to redo
+        '''
+        return bool(self._redo)
+
+    @property
+    def size(self):
+        '''
+        the approximate memory size of the recorded data in bytes
+        '''
+        return self._size
+
+    def undo(self):
+        '''
+        revert the modifications since the last checkpoint, or of the last step
+        '''
+        self.checkpoint()
+        if not self._undo:
+            raise IndexError('nothing to undo')
+
+        step = self._undo.pop()
+        self._apply(reversed(step), undo=True)
+        self._redo.append(step)
+
+    def redo(self):
+        '''
+        apply the last undone step again
+        '''
+        if not self._redo:
+            raise IndexError('nothing to redo')
+
+        step = self._redo.pop()
+        self._apply(step, undo=False)
+        self._undo.append(step)
+
+    def _apply(self, entries, undo):
+        '''
+        apply the given entries to the buffer, backwards if undoing
+        '''
+        buffer = self._buffer
+        self._replaying = True
+        try:
+            for entry in entries:
+                if entry[0] == 'bits':
+                    (_, start, length, old, new) = entry
+                    buffer.setbits(start, old if undo else new, length)
+                    continue
+
+                (_, start, old, new) = entry
+                if undo:
+                    (old, new) = (new, old)
+                if len(old) == len(new):
+                    buffer[start:start + len(old)] = new
+                    continue
+                if old:
+                    buffer.remove_bytes(start, len(old))
+                if new:
+                    buffer.insert_bytes(start, new)
+        finally:
+            self._replaying = False
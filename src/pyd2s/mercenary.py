@@ -3,9 +3,9 @@
 this module provides a class to manage mercenary data
 '''
 
-import struct
 import logging
 
+from pyd2s.bitfield import BitField
 from pyd2s.gamedata import GameData
 
 
@@ -13,6 +13,24 @@ class Mercenary:
     '''
     save data referring to the characters mercenary
     '''
+    # the mercenary fields are located relative to the start of the save file
+    _offset = 0
+
+    is_dead = BitField(
+        177 * 8, 16, bool, writable=True,
+        doc='True if the mercenary is currently dead, False otherwise')
+    control_seed = BitField(
+        179 * 8, 32, writable=True,
+        doc='the mercenary control seed')
+    name_id = BitField(
+        183 * 8, 16, writable=True,
+        doc='the id into the language dependent mercenary name table')
+    type_id = BitField(
+        185 * 8, 16, writable=True,
+        doc='the type of the active mercenary - encodes act and capabilities')
+    experience = BitField(
+        187 * 8, 32, writable=True,
+        doc='the experience points of the active mercenary')
 
     def __init__(self, buffer):
         '''
@@ -24,48 +42,6 @@ class Mercenary:
         self._merc_data = next(
             hireling for hireling in GameData.hireling if int(hireling['Id']) == self.type_id)
 
-    @property
-    def is_dead(self):
-        '''
-        True if the mercenary is currently dead, False otherwise
-        '''
-        return bool(struct.unpack_from('<H', self._buffer, 177)[0])
-
-    @is_dead.setter
-    def is_dead(self, value):
-        '''
-        set whether the mercenary is dead
-        '''
-        struct.pack_into('<H', self._buffer, 177, bool(value))
-
-    @property
-    def control_seed(self):
-        '''
-        the mercenary control seed
-        '''
-        return struct.unpack_from('<L', self._buffer, 179)[0]
-
-    @control_seed.setter
-    def control_seed(self, value):
-        '''
-        set the mercenary control seed
-        '''
-        struct.pack_into('<L', self._buffer, 179, value)
-
-    @property
-    def name_id(self):
-        '''
-        the id into the language dependent mercenary name table
-        '''
-        return struct.unpack_from('<H', self._buffer, 183)[0]
-
-    @name_id.setter
-    def name_id(self, value):
-        '''
-        set the name id of the mercenary
-        '''
-        struct.pack_into('<H', self._buffer, 183, value)
-
     @property
     def name(self):
         '''
@@ -74,37 +50,9 @@ class Mercenary:
         str_key = f'{self._merc_data["NameFirst"][:-2]}{self.name_id + 1:02}'
         return GameData.get_string(str_key)
 
-    @property
-    def type_id(self):
-        '''
-        the type of the active mercenary - encodes act and capabilities
-        '''
-        return struct.unpack_from('<H', self._buffer, 185)[0]
-
-    @type_id.setter
-    def type_id(self, value):
-        '''
-        set the type of the active mercenary
-        '''
-        struct.pack_into('<H', self._buffer, 185, value)
-
     @property
     def type(self):
         '''
         the human-readable type of the mercenary
         '''
         return f'{self._merc_data["Hireling"]} / {self._merc_data["SubType"]}'
-
-    @property
-    def experience(self):
-        '''
-        the experience points of the active mercenary
-        '''
-        return struct.unpack_from('<L', self._buffer, 187)[0]
-
-    @experience.setter
-    def experience(self, value):
-        '''
-        set the experience of the mercenary
-        '''
-        struct.pack_into('<H', self._buffer, 187, value)
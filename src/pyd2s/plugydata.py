@@ -2,10 +2,10 @@
 this module provides classes specific to PlugY stash data
 '''
 
-import struct
 from enum import Enum
 
 from pyd2s.item import Item
+from pyd2s.itemdata import ItemList
 from pyd2s.itemlocation import ItemMap
 from pyd2s.savebuffer import SaveBuffer
 
@@ -41,15 +41,16 @@ class PlugyStashPage:
         self._icount = buffer.dynamic_offset(ptr)
         ptr += 2
 
-        idata = []
+        # only the boundaries of the items are scanned, they are constructed along with the
+        # inventory map of the page, when it is first accessed
+        self._items = ItemList(buffer)
         for _ in range(self.icount):
-            item = Item.from_data(self._buffer, ptr)
-            ptr += item.length
-            idata.append(item)
+            self._items.append_offset(ptr)
+            ptr += Item.scan_length(self._buffer, ptr)
 
         self._end = buffer.dynamic_offset(ptr)
 
-        self._imap = ItemMap(10, 10, idata)
+        self._imap = None
 
     @property
     def header(self):
@@ -63,14 +64,14 @@ class PlugyStashPage:
         '''
         the flags of the page
         '''
-        return struct.unpack_from('<L', self._buffer, self._offset + 2)[0]
+        return self._buffer.unpack_from('<L', self._offset + 2)[0]
 
     @flags.setter
     def flags(self, value):
         '''
         set the flags on the page
         '''
-        struct.pack_into('<L', self._buffer, self._offset + 2, value)
+        self._buffer.pack_into('<L', self._offset + 2, value)
 
     @property
     def name(self):
@@ -100,27 +101,40 @@ class PlugyStashPage:
         '''
         the item count of the page
         '''
-        return struct.unpack_from('<H', self._buffer, self._icount)[0]
+        return self._buffer.unpack_from('<H', self._icount)[0]
 
     @icount.setter
     def icount(self, value):
         '''
         set the item count of the page
         '''
-        struct.pack_into('<H', self._buffer, self._offset + 9, value)
+        self._buffer.pack_into('<H', self._offset + 9, value)
 
     @property
     def idata(self):
         '''
         produce the item data of the stash page
         '''
-        return self._imap.items
+        return self.imap.items
+
+    @property
+    def offsets(self):
+        '''
+        produce the start offsets of the items of the stash page, without constructing them
+        '''
+        if self._imap is None:
+            return self._items.offsets
+        # pylint: disable=W0212
+        return [int(item._offset) for item in self._imap.items]
 
     @property
     def imap(self):
         '''
         produce an inventory map of the stash page
         '''
+        if self._imap is None:
+            self._imap = ItemMap(10, 10, self._items)
+            self._items = None
         return self._imap
 
     def take(self, item):
@@ -128,7 +142,7 @@ class PlugyStashPage:
         remove an item from the stash and return it with its own raw buffer
         '''
         # remove from the itemlist
-        self._imap.take(item)
+        self.imap.take(item)
 
         # update the item count
         self.icount -= 1
@@ -146,7 +160,7 @@ class PlugyStashPage:
         item.attach(self._buffer, int(self._end))
 
         # add to the itemlist
-        self._imap.put(item)
+        self.imap.put(item)
 
         # update the item count
         self.icount += 1
@@ -156,7 +170,7 @@ class PlugyStashPage:
         '''
         the raw data of the plugy page
         '''
-        return self._buffer[self._offset:self._end]
+        return self._buffer.view(self._offset, self._end)
 
     def detach(self):
         '''
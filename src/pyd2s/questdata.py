@@ -3,7 +3,6 @@
 this module provides classes to manage quest completion data of a d2s save
 '''
 
-import struct
 from enum import Enum
 
 from pyd2s.gamedata import GameData
@@ -101,7 +100,7 @@ class QuestData:
             if len(self._buffer) <= 335:
                 return 0
 
-            return struct.unpack_from('<H', self._buffer, 345 + self._offset + quest.offset)[0]
+            return self._buffer.unpack_from('<H', 345 + self._offset + quest.offset)[0]
 
         def __setitem__(self, quest, value):
             if len(self._buffer) <= 335:
@@ -110,7 +109,7 @@ class QuestData:
             if not isinstance(quest, Quest):
                 quest = Quest(quest)
 
-            struct.pack_into('<H', self._buffer, 345 + self._offset + quest.offset, value)
+            self._buffer.pack_into('<H', 345 + self._offset + quest.offset, value)
 
     def __init__(self, buffer):
         '''
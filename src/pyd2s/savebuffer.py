@@ -2,21 +2,42 @@
 '''
 this module provides a change-aware buffer for d2s files
 '''
+# pylint: disable=C0302
 
 import os
+import copy
+import mmap
+import bisect
 import struct
+import operator
+import contextlib
+import itertools
+import weakref
 import logging
-import datetime
 
+from pyd2s.changes import ChangedRanges
+from pyd2s.checksum import IncrementalChecksum
+from pyd2s.fileio import replace_file, flush_executor, completed
+from pyd2s.journal import Journal
 
-class SaveBuffer(bytearray):
+
+class SaveBuffer:
     '''
     manage the buffer of a save file and maintain its checksum
+
+    the data is held in a bytearray, or in a piece table after use_piece_table. it supports
+    len, iteration, indexing and slicing like a bytearray, but is not itself a bytes-like
+    object: use view or bytes to pass the data to functions that expect one.
     '''
+    # pylint: disable=R0902,R0904
     class BitPointer:
         '''
         a self-advancing bit-wise read pointer
         '''
+        # the number of string characters decoded per buffer access, enough for character
+        # names of up to 15 characters and their terminator
+        STRING_WINDOW = 16
+
         def __init__(self, buffer, offset):
             '''
             constructor
@@ -40,17 +61,64 @@ class SaveBuffer(bytearray):
             self._buffer.setbits(self._pos, value, length)
             self._pos += length
 
+        def read_fields(self, widths):
+            '''
+            read consecutive fields of the given bit widths with a single buffer access,
+            advancing the pointer, and return their values as a tuple
+            '''
+            total = sum(widths)
+            word = self._buffer.getbits(self._pos, total)
+            self._pos += total
+
+            res = []
+            for width in widths:
+                res.append(word & ((1 << width) - 1))
+                word >>= width
+            return tuple(res)
+
+        def write_fields(self, widths, values):
+            '''
+            overwrite consecutive fields of the given bit widths with a single buffer access,
+            advancing the pointer
+            '''
+            word = 0
+            shift = 0
+            for (width, value) in zip(widths, values):
+                word |= (value & ((1 << width) - 1)) << shift
+                shift += width
+
+            self._buffer.setbits(self._pos, word, shift)
+            self._pos += shift
+
         def read_string(self):
             '''
-            read a 7-bit ascii null-terminated string from the buffer
+            read a 7-bit ascii null-terminated string from the buffer, decoding the characters
+            from words of STRING_WINDOW characters at a time
             '''
             res = bytearray()
             while True:
-                next_char = self.read(7)
-                if next_char == 0:
-                    break
-                res.append(next_char)
-            return res.decode('ascii')
+                count = min(self.STRING_WINDOW, (len(self._buffer) * 8 - self._pos) // 7) or 1
+                word = self._buffer.getbits(self._pos, count * 7)
+                for _ in range(count):
+                    char = word & 0x7f
+                    word >>= 7
+                    self._pos += 7
+                    if char == 0:
+                        return res.decode('ascii')
+                    res.append(char)
+
+        def write_string(self, value):
+            '''
+            overwrite the next bits with the given string as 7-bit ascii, null-terminated,
+            advancing the pointer
+            '''
+            data = value.encode('ascii') + b'\x00'
+            word = 0
+            for char in reversed(data):
+                word = (word << 7) | char
+
+            self._buffer.setbits(self._pos, word, len(data) * 7)
+            self._pos += len(data) * 7
 
         @property
         def value(self):
@@ -69,12 +137,16 @@ class SaveBuffer(bytearray):
     class DynamicOffset:
         '''
         an offset into the save buffer that is kept around and updated when necessary
+
+        while tracked by an OffsetRegistry, the stored value is relative to the shift of the
+        registry bucket that holds it.
         '''
         def __init__(self, offset):
             '''
             constructor
             '''
             self._offset = offset
+            self._bucket = SaveBuffer.OffsetRegistry.UNTRACKED
 
         def __add__(self, other):
             '''
@@ -98,15 +170,13 @@ class SaveBuffer(bytearray):
             '''
             use the offset as an index
             '''
-            return self._offset
+            return self._offset + self._bucket.delta
 
         def __ge__(self, other):
             '''
             enable integer comparison
             '''
-            if self.__class__ is other.__class__:
-                return self._offset >= other._offset
-            return self._offset >= other
+            return int(self) >= int(other)
 
         def adjust_by(self, value):
             '''
@@ -114,38 +184,859 @@ class SaveBuffer(bytearray):
             '''
             self._offset += value
 
+    class OffsetRegistry:
+        '''
+        a sorted registry of dynamic offsets.
+
+        the offsets are partitioned into buckets of neighbouring values. each bucket carries a
+        shift that applies to all of its offsets, so that moving everything behind an edit
+        only touches the offsets of a single bucket individually, while reading an offset
+        stays a single addition.
+
+        offsets are only referenced weakly, so that offsets of objects that have been dropped
+        without being detached disappear by themselves. buckets left empty or sparse by that
+        are compacted periodically.
+        '''
+        # pylint: disable=W0212
+
+        class Bucket:
+            '''
+            a group of neighbouring offsets sharing a common shift
+            '''
+            # pylint: disable=R0903
+
+            def __init__(self, low, delta):
+                '''
+                constructor
+                '''
+                self.low = low
+                self.delta = delta
+                self.offsets = weakref.WeakSet()
+
+            def __len__(self):
+                '''
+                the number of offsets in the bucket
+                '''
+                return len(self.offsets)
+
+        # a bucket that is never part of a registry, for offsets that are not tracked
+        UNTRACKED = Bucket(0, 0)
+
+        # the number of offsets at which a bucket is split in two
+        BUCKET_SIZE = 256
+
+        # the number of added offsets after which the buckets are compacted
+        COMPACT_INTERVAL = 4096
+
+        def __init__(self):
+            '''
+            constructor
+            '''
+            self._buckets = [self.Bucket(0, 0)]
+            self._added = 0
+
+        def __len__(self):
+            '''
+            the number of tracked offsets
+            '''
+            return sum(len(bucket) for bucket in self._buckets)
+
+        @property
+        def buckets(self):
+            '''
+            the number of buckets currently in use
+            '''
+            return len(self._buckets)
+
+        @staticmethod
+        def _low(bucket):
+            '''
+            the lowest value a bucket is responsible for
+            '''
+            return bucket.low + bucket.delta
+
+        def add(self, offset):
+            '''
+            start tracking the given dynamic offset
+            '''
+            value = int(offset)
+            index = max(0, bisect.bisect_right(self._buckets, value, key=self._low) - 1)
+            bucket = self._buckets[index]
+
+            offset._offset = value - bucket.delta
+            offset._bucket = bucket
+            bucket.offsets.add(offset)
+            bucket.low = min(bucket.low, offset._offset)
+
+            if len(bucket) > self.BUCKET_SIZE:
+                self._split(index)
+
+            self._added += 1
+            if self._added >= self.COMPACT_INTERVAL:
+                self.compact()
+
+        def discard(self, offset):
+            '''
+            stop tracking the given dynamic offset, freezing its current value
+            '''
+            bucket = offset._bucket
+            bucket.offsets.remove(offset)
+
+            offset._offset += bucket.delta
+            offset._bucket = self.UNTRACKED
+
+            if not bucket.offsets and len(self._buckets) > 1:
+                self._buckets.remove(bucket)
+
+        def compact(self):
+            '''
+            drop empty buckets and merge sparse neighbouring buckets
+            '''
+            self._added = 0
+
+            buckets = []
+            for bucket in self._buckets:
+                if not bucket.offsets:
+                    continue
+
+                if buckets and len(buckets[-1]) + len(bucket) <= self.BUCKET_SIZE // 2:
+                    target = buckets[-1]
+                    for offset in list(bucket.offsets):
+                        offset._offset += bucket.delta - target.delta
+                        offset._bucket = target
+                        target.offsets.add(offset)
+                    continue
+
+                buckets.append(bucket)
+
+            if not buckets:
+                buckets.append(self.Bucket(0, 0))
+            self._buckets = buckets
+
+        def _split(self, index):
+            '''
+            split the bucket at the given index in two halves
+            '''
+            bucket = self._buckets[index]
+            offsets = sorted(bucket.offsets, key=lambda offset: offset._offset)
+            upper = offsets[len(offsets) // 2:]
+
+            new = self.Bucket(upper[0]._offset, bucket.delta)
+            new.offsets.update(upper)
+            bucket.offsets.difference_update(upper)
+            for offset in upper:
+                offset._bucket = new
+
+            self._buckets.insert(index + 1, new)
+
+        def insert_bytes(self, start, length, anchor=None):
+            '''
+            move all offsets at or behind start back by length. if an anchor offset is given,
+            it is the only one of the offsets at start that moves.
+            '''
+            first = bisect.bisect_left(self._buckets, start, key=self._low)
+            last = first
+            if anchor is not None:
+                last = bisect.bisect_right(self._buckets, start, key=self._low)
+
+            # only the bucket in front of the edit, and the buckets starting right at it if
+            # there is an anchor, may hold offsets that need to be adjusted individually
+            for bucket in itertools.islice(self._buckets, max(0, first - 1), last):
+                for offset in bucket.offsets:
+                    value = offset._offset + bucket.delta
+                    if value > start or (value == start and anchor in (None, offset)):
+                        offset._offset += length
+
+            for bucket in itertools.islice(self._buckets, last, None):
+                bucket.delta += length
+
+            # the anchor is now behind the other offsets that were at start, which may be held
+            # by the following buckets, so it is moved to the last bucket starting at start
+            if anchor is not None and anchor._bucket is not self.UNTRACKED and last > 0:
+                self._move(anchor, last - 1)
+
+        def _move(self, offset, index):
+            '''
+            move the given tracked offset into the bucket at the given index, keeping its value
+            '''
+            (source, target) = (offset._bucket, self._buckets[index])
+            if source is target:
+                return
+
+            source.offsets.remove(offset)
+            offset._offset += source.delta - target.delta
+            offset._bucket = target
+            target.offsets.add(offset)
+
+            if len(target) > self.BUCKET_SIZE:
+                self._split(index)
+            if not source.offsets:
+                self._buckets.remove(source)
+
+        def remove_bytes(self, start, length):
+            '''
+            move all offsets behind the removed range forward by length. offsets inside the
+            removed range collapse onto its start.
+            '''
+            end = start + length
+            index = bisect.bisect_left(self._buckets, start, key=self._low)
+            index_end = bisect.bisect_left(self._buckets, end, key=self._low)
+
+            # the bucket in front of the range and all buckets starting inside of it
+            # may hold offsets that need to be adjusted individually
+            for bucket in itertools.islice(self._buckets, max(0, index - 1), index_end):
+                for offset in bucket.offsets:
+                    value = offset._offset + bucket.delta
+                    if value >= end:
+                        offset._offset -= length
+                    elif value >= start:
+                        offset._offset = start - bucket.delta
+                bucket.low = min(bucket.low, start - bucket.delta)
+
+            for bucket in itertools.islice(self._buckets, index_end, None):
+                bucket.delta -= length
+
+    class PieceTable:
+        '''
+        a sequence of bytes stored as a list of spans of source buffers.
+
+        insertions and removals only split and drop spans instead of moving the data behind
+        them. the bytes are joined back into a contiguous buffer on request.
+
+        the spans are partitioned into blocks of neighbouring spans, like the buckets of the
+        offset registry. an edit only updates the span positions within its block, and the
+        positions of the blocks are recomputed lazily in a single pass.
+
+        spans are private if their source belongs to this table alone, and writes to all
+        other spans, such as those of memory maps or of shared snapshots, are copied first.
+        '''
+        # the granularity of copy-on-write for shared sources
+        PAGE_SIZE = 4096
+
+        # the number of spans at which a block is split in two
+        BLOCK_SIZE = 128
+
+        class Block:
+            '''
+            a group of neighbouring spans, with their positions relative to the block
+            '''
+            # pylint: disable=R0903
+            __slots__ = ('pieces', 'starts', 'length')
+
+            def __init__(self, pieces):
+                '''
+                constructor
+                '''
+                # each piece is a tuple of (source, start, length, private)
+                self.pieces = pieces
+                self.starts = []
+                self.length = 0
+                self.update()
+
+            def update(self):
+                '''
+                recompute the positions of the spans after a change
+                '''
+                self.starts = list(itertools.accumulate(
+                    map(operator.itemgetter(2), self.pieces), initial=0))
+                self.length = self.starts.pop()
+
+        def __init__(self, data):
+            '''
+            constructor
+            '''
+            piece = (data, 0, len(data), isinstance(data, bytearray))
+            self._blocks = [self.Block([piece])] if data else []
+            self._starts = None
+            self._length = len(data)
+
+        def __len__(self):
+            '''
+            the length of the byte sequence
+            '''
+            return self._length
+
+        @property
+        def pieces(self):
+            '''
+            the number of pieces the byte sequence is made up of
+            '''
+            return sum(len(block.pieces) for block in self._blocks)
+
+        @property
+        def private(self):
+            '''
+            the number of bytes held in private spans
+            '''
+            return sum(piece[2] for block in self._blocks for piece in block.pieces if piece[3])
+
+        def _block_starts(self):
+            '''
+            produce the positions of the blocks, recomputing them if they changed
+            '''
+            if self._starts is None:
+                self._starts = list(itertools.accumulate(
+                    map(operator.attrgetter('length'), self._blocks), initial=0))
+                self._starts.pop()
+            return self._starts
+
+        def _locate(self, pos):
+            '''
+            produce the indices of the block and the piece holding the given position, and the
+            position of that piece
+            '''
+            starts = self._block_starts()
+            index = bisect.bisect_right(starts, pos) - 1
+            block = self._blocks[index]
+            piece = bisect.bisect_right(block.starts, pos - starts[index]) - 1
+            return (index, piece, starts[index] + block.starts[piece])
+
+        def _split(self, pos):
+            '''
+            make sure a piece starts at the given position and produce the indices of its
+            block and of the piece
+            '''
+            if pos >= self._length:
+                return (len(self._blocks), 0)
+
+            (index, piece, start) = self._locate(pos)
+            skip = pos - start
+            if not skip:
+                return (index, piece)
+
+            block = self._blocks[index]
+            (source, offset, length, private) = block.pieces[piece]
+            block.pieces[piece:piece + 1] = [
+                (source, offset, skip, private), (source, offset + skip, length - skip, private)]
+            # the positions of the other spans and the length of the block stay the same
+            block.starts.insert(piece + 1, block.starts[piece] + skip)
+            return (index, piece + 1)
+
+        def _pieces(self, first, last):
+            '''
+            produce the block and piece indices of all pieces from the first up to the last
+            given pair of indices
+            '''
+            (index, piece) = first
+            while (index, piece) < last and index < len(self._blocks):
+                if piece < len(self._blocks[index].pieces):
+                    yield (index, piece)
+                    piece += 1
+                else:
+                    (index, piece) = (index + 1, 0)
+
+        def _changed(self, indices):
+            '''
+            update the blocks at the given indices after their pieces changed, splitting full
+            blocks, merging sparse ones and dropping empty ones
+            '''
+            for index in sorted(set(indices), reverse=True):
+                if index >= len(self._blocks):
+                    continue
+
+                block = self._blocks[index]
+                block.update()
+                if len(block.pieces) > self.BLOCK_SIZE:
+                    half = len(block.pieces) // 2
+                    self._blocks[index:index + 1] = [
+                        self.Block(block.pieces[:half]), self.Block(block.pieces[half:])]
+                elif not block.pieces:
+                    del self._blocks[index]
+                elif (index > 0 and len(block.pieces) < self.BLOCK_SIZE // 4
+                      and len(self._blocks[index - 1].pieces) < self.BLOCK_SIZE // 2):
+                    self._blocks[index - 1].pieces.extend(block.pieces)
+                    self._blocks[index - 1].update()
+                    del self._blocks[index]
+
+            self._starts = None
+
+        def chunks(self, start=0, end=None):
+            '''
+            produce memoryviews of the spans covering the given range
+            '''
+            end = self._length if end is None else min(end, self._length)
+            if start >= end:
+                return
+
+            (index, piece, pos) = self._locate(start)
+            skip = start - pos
+            while start < end:
+                block = self._blocks[index]
+                for (source, offset, length, _) in itertools.islice(block.pieces, piece, None):
+                    size = min(length - skip, end - start)
+                    yield memoryview(source)[offset + skip:offset + skip + size]
+                    start += size
+                    skip = 0
+                    if start >= end:
+                        return
+                (index, piece) = (index + 1, 0)
+
+        def read(self, start, end):
+            '''
+            produce a copy of the bytes in the given range
+            '''
+            if start < end:
+                (index, piece, pos) = self._locate(start)
+                (source, offset, length, _) = self._blocks[index].pieces[piece]
+                skip = start - pos
+                if end - start <= length - skip:
+                    return source[offset + skip:offset + skip + end - start]
+            return bytearray().join(self.chunks(start, end))
+
+        def own(self, start, end):
+            '''
+            copy the spans of shared sources covering the given range into private memory,
+            in pages of PAGE_SIZE bytes
+            '''
+            first = self._split(start - start % self.PAGE_SIZE)
+            last = self._split(min(end - end % -self.PAGE_SIZE, self._length))
+            changed = []
+            for (index, piece) in list(self._pieces(first, last)):
+                pieces = self._blocks[index].pieces
+                (source, offset, length, private) = pieces[piece]
+                if not private:
+                    pieces[piece] = (bytearray(source[offset:offset + length]), 0, length, True)
+                    changed.append(index)
+            self._changed(changed)
+
+        def write(self, start, data):
+            '''
+            overwrite the bytes at the given position, without changing the length. spans of
+            shared sources are copied on write.
+            '''
+            end = start + len(data)
+            if start >= end:
+                return
+
+            (index, piece, _) = self._locate(start)
+            (last, last_piece, _) = self._locate(end - 1)
+            if not all(self._blocks[i].pieces[j][3]
+                       for (i, j) in self._pieces((index, piece), (last, last_piece + 1))):
+                self.own(start, end)
+
+            pos = 0
+            for chunk in self.chunks(start, end):
+                chunk[:] = data[pos:pos + len(chunk)]
+                pos += len(chunk)
+
+        def insert(self, pos, data):
+            '''
+            insert the given bytes at the given position
+            '''
+            if not data:
+                return
+
+            piece = (bytearray(data), 0, len(data), True)
+            (index, at) = self._split(pos)
+            if index == len(self._blocks):
+                if not self._blocks:
+                    self._blocks.append(self.Block([]))
+                index = len(self._blocks) - 1
+                at = len(self._blocks[index].pieces)
+
+            self._blocks[index].pieces.insert(at, piece)
+            self._length += len(data)
+            self._changed([index])
+
+        def delete(self, pos, length):
+            '''
+            remove the given number of bytes at the given position
+            '''
+            length = min(length, self._length - pos)
+            if length <= 0:
+                return
+
+            (first, first_piece) = self._split(pos)
+            (last, last_piece) = self._split(pos + length)
+            if first == last:
+                del self._blocks[first].pieces[first_piece:last_piece]
+            else:
+                del self._blocks[first].pieces[first_piece:]
+                if last < len(self._blocks):
+                    del self._blocks[last].pieces[:last_piece]
+                for index in range(first + 1, last):
+                    self._blocks[index].pieces.clear()
+
+            self._length -= length
+            self._changed(range(first, last + 1))
+
+        def join(self):
+            '''
+            produce the byte sequence as a contiguous buffer
+            '''
+            return bytearray().join(self.chunks())
+
+        def fork(self):
+            '''
+            produce a copy of the byte sequence that shares its spans. all spans are marked as
+            shared in both copies, so that either copy copies them on write. this costs time
+            in the number of pieces, not in the size of the data.
+            '''
+            # pylint: disable=W0212
+            for block in self._blocks:
+                block.pieces = [(source, start, length, False)
+                                for (source, start, length, _) in block.pieces]
+
+            res = type(self)(b'')
+            res._blocks = [self.Block(list(block.pieces)) for block in self._blocks]
+            res._length = self._length
+            return res
+
     @classmethod
-    def open(cls, path):
+    def open(cls, path, mode='r+', pieces=False):
         '''
-        read the input file into memory
+        read the input file into memory, optionally using a piece table. in mode 'r', the
+        file is memory-mapped read-only instead.
         '''
+        if mode == 'r':
+            return cls.map(path)
+        if mode != 'r+':
+            raise ValueError(f"invalid mode: '{mode}'")
+
         with open(path, 'rb') as save:
             res = cls(save.read())
         res._path = path
+        if pieces:
+            res.use_piece_table()
         return res
 
+    @classmethod
+    def map(cls, path):
+        '''
+        memory-map the input file read-only, sharing its pages with the os cache
+        '''
+        with open(path, 'rb') as save:
+            try:
+                data = mmap.mmap(save.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # empty files can not be mapped
+                data = b''
+
+        res = cls._from_table(cls.PieceTable(data))
+        res._path = path
+        res._readonly = True
+        return res
+
+    @classmethod
+    def _from_table(cls, table):
+        '''
+        produce a buffer in the piece table representation holding the given table
+        '''
+        res = cls(b'')
+        res._data = None
+        res._table = table
+        res.__class__ = cls._piece_table_class()
+        return res
+
+    @classmethod
+    def _piece_table_class(cls):
+        '''
+        produce the class of the buffers of this class in the piece table representation.
+        subclasses get a variant that mixes in PieceTableBuffer behind their own methods, so
+        that their overrides survive the switch.
+        '''
+        if cls is SaveBuffer:
+            return PieceTableBuffer
+        if '_piece_table_variant' not in cls.__dict__:
+            cls._piece_table_variant = type(cls.__name__, (cls, PieceTableBuffer), {
+                '__doc__': cls.__doc__,
+                '__module__': cls.__module__,
+                '__qualname__': cls.__qualname__,
+                '_contiguous_class': cls,
+            })
+        return cls._piece_table_variant
+
     def __init__(self, data):
         '''
         constructor
         '''
-        super().__init__(data)
+        self._data = bytearray(data)
 
         self._path = None
-        self._dynamic_offsets = []
+        self._dynamic_offsets = self.OffsetRegistry()
+        self._table = None
+        self._readonly = False
+        self._checksum = IncrementalChecksum()
+        self._changes = ChangedRanges()
+        self._pending = []
+        self._journal = None
 
     @property
     def _size(self):
         '''
         get the size of the save file in bytes
         '''
-        return struct.unpack_from('<L', self, 0x08)[0]
+        return self.unpack_from('<L', 0x08)[0]
 
     @_size.setter
     def _size(self, value):
         '''
         set the size of the save file in bytes
         '''
-        struct.pack_into('<L', self, 0x08, value)
+        self.pack_into('<L', 0x08, value)
+
+    def use_piece_table(self):
+        '''
+        switch to a piece table representation of the data, that records insertions and
+        removals as spans until the buffer is materialized again
+        '''
+        (self._table, self._data) = (self.PieceTable(self._data), None)
+        self.__class__ = self._piece_table_class()
+
+    def materialize(self):
+        '''
+        make sure the data is stored contiguously
+        '''
+
+    @property
+    def readonly(self):
+        '''
+        indicate whether the buffer rejects modifications
+        '''
+        return self._readonly
+
+    def make_writable(self):
+        '''
+        allow modifications of a read-only buffer. the data of memory-mapped files is copied
+        on write, the file itself is only changed by a flush.
+        '''
+        self._readonly = False
+
+    def fork(self):
+        '''
+        produce an independent copy of the buffer for what-if edits, in the piece table
+        representation. the copy shares a snapshot of the data and copies the pages it
+        modifies on write. dynamic offsets are not carried over.
+
+        contiguous data is modified in place, so taking the snapshot copies it once, which
+        costs time and memory in the size of the data. forks of the fork share that
+        snapshot, and buffers already in the piece table representation are forked without
+        copying any data.
+        '''
+        return self._forked(self.PieceTable(bytes(self)))
+
+    def _forked(self, table):
+        '''
+        produce a copy of the buffer holding the given table, with the same path, read-only
+        state and change tracking
+        '''
+        # pylint: disable=W0212
+        res = self._from_table(table)
+        res._path = self._path
+        res._readonly = self._readonly
+        res._checksum = copy.deepcopy(self._checksum)
+        res._changes = copy.deepcopy(self._changes)
+        return res
+
+    @contextlib.contextmanager
+    def transaction(self):
+        '''
+        queue the structural edits made within the context in a piece table, and apply them
+        to the contiguous data in a single pass when the outermost context is left. edits are
+        not rolled back on errors.
+        '''
+        if self._table is not None:
+            yield self
+            return
+
+        self.use_piece_table()
+        try:
+            yield self
+        finally:
+            self.materialize()
+
+    def _before(self, start, end):
+        '''
+        produce the bytes from start to end that are about to be replaced, if there is a
+        journal to record them in
+        '''
+        if self._journal is None:
+            return None
+        return bytes(self[start:end])
+
+    def _modified(self, start, end, length=None, old=None):
+        '''
+        note that the bytes from start to end have changed, and have been replaced by length
+        bytes if the edit was structural. the old bytes, if given, are journaled.
+        '''
+        if length is None:
+            length = end - start
+        if self._pending:
+            self._settle()
+        for (_, changes) in self._pending:
+            changes.update(start, end, length)
+        self._changes.update(start, end, length)
+        self._checksum.invalidate(start, end if length == end - start else None)
+
+        if old is not None:
+            self._journal.splice(start, old, self[start:start + length])
+
+    def _span(self, key):
+        '''
+        produce the range of bytes covered by the given index or slice
+        '''
+        if not isinstance(key, slice):
+            start = operator.index(key) % max(len(self), 1)
+            return (start, start + 1)
+
+        (start, stop, step) = key.indices(len(self))
+        if step == 1:
+            return (start, max(start, stop))
+        indices = range(start, stop, step)
+        if not indices:
+            return (start, start)
+        return (min(indices), max(indices) + 1)
+
+    def _contents(self):
+        '''
+        produce the data as a bytes-like object
+        '''
+        return self._data
+
+    def __len__(self):
+        '''
+        the length of the data
+        '''
+        return len(self._data)
+
+    def __iter__(self):
+        '''
+        iterate over the bytes of the data
+        '''
+        return iter(self._data)
+
+    def __bytes__(self):
+        '''
+        produce a copy of the data
+        '''
+        return bytes(self._data)
+
+    def __getitem__(self, key):
+        '''
+        read a single byte, or a copy of a slice of bytes
+        '''
+        return self._data[key]
+
+    def __eq__(self, other):
+        '''
+        compare the data to another buffer or bytes-like object
+        '''
+        if isinstance(other, SaveBuffer):
+            other = other._contents()
+        return self._contents() == other
+
+    __hash__ = None
+
+    def __contains__(self, value):
+        '''
+        indicate whether the data contains the given byte or subsequence
+        '''
+        return value in self._contents()
+
+    def __repr__(self):
+        '''
+        a string representation of the buffer and its data
+        '''
+        return f'{type(self).__name__}({bytes(self._contents())!r})'
+
+    def find(self, sub, start=None, end=None):
+        '''
+        produce the lowest position of the given subsequence in the data, or -1
+        '''
+        return self._contents().find(sub, start, end)
+
+    def count(self, sub, start=None, end=None):
+        '''
+        produce the number of non-overlapping occurrences of the given subsequence
+        '''
+        return self._contents().count(sub, start, end)
+
+    def startswith(self, prefix, start=None, end=None):
+        '''
+        indicate whether the data starts with the given prefix
+        '''
+        return self._contents().startswith(prefix, start, end)
+
+    def endswith(self, suffix, start=None, end=None):
+        '''
+        indicate whether the data ends with the given suffix
+        '''
+        return self._contents().endswith(suffix, start, end)
+
+    def hex(self, *args):
+        '''
+        produce the data as a string of hexadecimal digits
+        '''
+        return self._contents().hex(*args)
+
+    def decode(self, encoding='utf-8', errors='strict'):
+        '''
+        decode the data to a string
+        '''
+        return self._contents().decode(encoding, errors)
+
+    def __setitem__(self, key, value):
+        '''
+        overwrite a single byte or a slice of bytes, keeping track of the change
+        '''
+        (start, end) = self._span(key)
+        (size, old) = (len(self), self._before(start, end))
+        self._data[key] = value
+        self._modified(start, end, end - start + len(self) - size, old)
+
+    def __delitem__(self, key):
+        '''
+        remove a single byte or a slice of bytes, keeping track of the change
+        '''
+        (start, end) = self._span(key)
+        (size, old) = (len(self), self._before(start, end))
+        del self._data[key]
+        self._modified(start, end, end - start + len(self) - size, old)
+
+    def unpack_from(self, fmt, offset=0):
+        '''
+        unpack the given struct format from the buffer at the given offset
+        '''
+        return struct.unpack_from(fmt, self._data, offset)
+
+    def pack_into(self, fmt, offset, *values):
+        '''
+        pack the given values in the given struct format into the buffer at the given offset
+        '''
+        (start, end) = (int(offset), int(offset) + struct.calcsize(fmt))
+        old = self._before(start, end)
+        struct.pack_into(fmt, self._data, start, *values)
+        self._modified(start, end, old=old)
+
+    def checksum(self):
+        '''
+        produce the d2s checksum of the data, counting the stored checksum as zero. only the
+        data behind the first change since the last call is processed again.
+        '''
+        return self._checksum.update(self)
+
+    def record(self, max_size=Journal.MAX_SIZE):
+        '''
+        start recording the modifications of the buffer in a journal that allows undoing
+        them, keeping at most about max_size bytes of data, and return the journal
+        '''
+        self._journal = Journal(self, max_size)
+        return self._journal
+
+    @property
+    def journal(self):
+        '''
+        the journal of the modifications of the buffer, if they are recorded
+        '''
+        return self._journal
+
+    @property
+    def changes(self):
+        '''
+        the byte ranges that changed since the data was read or last written
+        '''
+        self._settle()
+        return self._changes
 
     @property
     def path(self):
@@ -159,14 +1050,14 @@ class SaveBuffer(bytearray):
         produce a dynamic reference to an offset into the buffer
         '''
         res = self.DynamicOffset(offset)
-        self._dynamic_offsets.append(res)
+        self._dynamic_offsets.add(res)
         return res
 
     def remove_dynamic_offset(self, offset):
         '''
         stop tracking the given offset
         '''
-        self._dynamic_offsets.remove(offset)
+        self._dynamic_offsets.discard(offset)
 
     def bit_pointer(self, offset):
         '''
@@ -174,56 +1065,329 @@ class SaveBuffer(bytearray):
         '''
         return self.BitPointer(self, offset)
 
-    def insert_bytes(self, start, length):
+    def insert_bytes(self, start, data):
         '''
-        insert the given number of zero bytes in the buffer
+        insert the given bytes, or the given number of zero bytes, in the buffer. if start
+        is a dynamic offset, other dynamic offsets at the same position stay in front of the
+        inserted bytes.
         '''
+        if isinstance(data, int):
+            data = bytes(data)
+        length = len(data)
+
+        anchor = start if isinstance(start, self.DynamicOffset) else None
+        start = int(start)
         logging.debug('SaveBuffer:inserting %d bytes at %d', length, start)
-        self[start:start] = [0] * length
+        self[start:start] = data
 
         # update the dynamic offsets
-        for offset in self._dynamic_offsets:
-            if offset >= start:
-                offset.adjust_by(length)
+        self._dynamic_offsets.insert_bytes(start, length, anchor)
 
     def remove_bytes(self, start, length):
         '''
         take the given number of bytes from the buffer
         '''
+        start = int(start)
         logging.debug('SaveBuffer:removing %d bytes at %d', length, start)
-        self[start:start + length] = []
+        del self[start:start + length]
 
         # update the dynamic offsets
-        for offset in self._dynamic_offsets:
-            if offset >= start:
-                offset.adjust_by(-length)
+        self._dynamic_offsets.remove_bytes(start, length)
+
+    def view(self, start, end):
+        '''
+        produce a read-only view of the given range of the buffer without copying. the
+        buffer can not be resized while the view is held.
+        '''
+        return memoryview(self._data)[int(start):int(end)].toreadonly()
 
     def getbits(self, start, length):
         '''
         produce an integer from the given bit position and length
         '''
-        res = 0
-        for i in range(length):
-            pos = start + i
-            res |= ((self[pos >> 3] & (1 << (pos & 0x07))) != 0) << i
-        return res
+        # read all bytes covering the requested bits at once, then mask and shift
+        first = start >> 3
+        last = (start + length + 7) >> 3
+        data = self._data
+        if last - first == 1:
+            word = data[first]
+        elif last > len(data):
+            raise IndexError('bit range out of buffer bounds')
+        else:
+            word = int.from_bytes(data[first:last], 'little')
+        return (word >> (start & 0x07)) & ((1 << length) - 1)
 
     def setbits(self, start, value, length):
         '''
         set the given bits to the given value
         '''
-        for i in range(length):
-            pos = start + i
-            self[pos >> 3] ^= (-((value >> i) & 0x1) ^ self[pos >> 3]) & (1 << (pos & 0x07))
+        # merge the value into the covering bytes and write them back at once
+        first = start >> 3
+        last = (start + length + 7) >> 3
+        if last > len(self._data):
+            raise IndexError('bit range out of buffer bounds')
+
+        shift = start & 0x07
+        mask = ((1 << length) - 1) << shift
+
+        word = int.from_bytes(self._data[first:last], 'little')
+        if self._journal is not None:
+            self._journal.bits(start, length, (word & mask) >> shift, value & (mask >> shift))
+
+        word = (word & ~mask) | ((value << shift) & mask)
+        self._data[first:last] = word.to_bytes(last - first, 'little')
+        self._modified(first, last)
+
+    def flush(self, backup=False, async_=False):
+        '''
+        write the data back to disk, with optional backup. the data is written to a temporary
+        file that replaces the save file once it is complete, so that the save file is never
+        left half-written. if async_ is given, a snapshot of the data is written in the
+        background, and a future of the write is returned. nothing is written if the data
+        did not change.
+        '''
+        self._settle()
+        if not self._changes:
+            logging.debug('SaveBuffer:skipping flush of unchanged %s', self._path)
+            return completed() if async_ else None
+
+        if not async_:
+            replace_file(self._path, self._chunks(), backup)
+            self._changes.clear()
+            return None
+
+        # the changes of the snapshot are set aside, and kept up to date with later edits
+        # until the write completes, so that they can be restored if it fails
+        data = bytes(self)
+        (changes, self._changes) = (self._changes, ChangedRanges())
+        future = flush_executor().submit(replace_file, self._path, (data,), backup)
+        self._pending.append((future, changes))
+        return future
+
+    def _settle(self):
+        '''
+        drop the set aside changes of completed background writes, and restore those of
+        failed ones
+        '''
+        pending = []
+        for (future, changes) in self._pending:
+            if not future.done():
+                pending.append((future, changes))
+            elif future.cancelled() or future.exception() is not None:
+                self._changes.merge(changes)
+        self._pending = pending
+
+    def _chunks(self):
+        '''
+        produce the data of the buffer as a sequence of bytes-like objects
+        '''
+        return (self._data,)
+
+
+class PieceTableBuffer(SaveBuffer):
+    '''
+    a save buffer that keeps its data in a piece table, so that insertions and removals do
+    not have to move the data behind them. buffers enter this representation through
+    SaveBuffer.use_piece_table, and leave it again when they are materialized.
+    '''
+    _contiguous_class = SaveBuffer
+
+    @classmethod
+    def _piece_table_class(cls):
+        '''
+        the class is already in the piece table representation
+        '''
+        return cls
+
+    def use_piece_table(self):
+        '''
+        the piece table is already in use
+        '''
+
+    def _check_writable(self):
+        '''
+        raise an error if the buffer is read-only
+        '''
+        if self._readonly:
+            raise PermissionError('save buffer is read-only, use make_writable() to modify it')
+
+    def fork(self):
+        '''
+        produce an independent copy of the buffer for what-if edits, sharing the pieces of
+        the data. this costs time in the number of pieces, not in the size of the data.
+        dynamic offsets are not carried over.
+        '''
+        return self._forked(self._table.fork())
+
+    def materialize(self):
+        '''
+        join the pieces back into contiguous data and leave the piece table representation
+        '''
+        self._check_writable()
+        data = self._table.join()
+        (self._table, self._data) = (None, data)
+        self.__class__ = self._contiguous_class
+
+    def __len__(self):
+        '''
+        the length of the data
+        '''
+        return len(self._table)
+
+    def __iter__(self):
+        '''
+        iterate over the bytes of the data
+        '''
+        for chunk in self._table.chunks():
+            yield from chunk
 
-    def flush(self, backup=False):
+    def __bytes__(self):
         '''
-        write the changed data back to disk, with optional backup
+        produce a contiguous copy of the data
         '''
-        if backup:
-            mtime = os.path.getmtime(self._path)
-            timestamp = datetime.datetime.fromtimestamp(mtime).strftime("%Y%m%d-%H%M%S")
-            os.rename(self._path, self._path + "_" + timestamp)
+        return bytes(self._table.join())
 
-        with open(self._path, 'wb') as save:
-            save.write(self)
+    def _contents(self):
+        '''
+        produce the data as a contiguous bytes-like object
+        '''
+        return self._table.join()
+
+    def _slice(self, key):
+        '''
+        resolve a slice key to a start and end position
+        '''
+        (start, end, step) = key.indices(len(self._table))
+        if step != 1:
+            raise ValueError('extended slices are not supported by piece table buffers')
+        return (start, max(start, end))
+
+    def __getitem__(self, key):
+        '''
+        read a single byte or a slice of bytes
+        '''
+        if isinstance(key, slice):
+            return self._table.read(*self._slice(key))
+
+        pos = operator.index(key)
+        if pos < 0:
+            pos += len(self._table)
+        if not 0 <= pos < len(self._table):
+            raise IndexError('piece table buffer index out of range')
+        return self._table.read(pos, pos + 1)[0]
+
+    def __setitem__(self, key, value):
+        '''
+        overwrite a single byte or a slice of bytes, splicing if the length changes
+        '''
+        self._check_writable()
+        if not isinstance(key, slice):
+            pos = operator.index(key)
+            if pos < 0:
+                pos += len(self._table)
+            if not 0 <= pos < len(self._table):
+                raise IndexError('piece table buffer index out of range')
+            old = self._before(pos, pos + 1)
+            self._table.write(pos, bytes((value,)))
+            self._modified(pos, pos + 1, old=old)
+            return
+
+        (start, end) = self._slice(key)
+        if not isinstance(value, (bytes, bytearray, memoryview)):
+            value = bytes(value)
+        old = self._before(start, end)
+        if len(value) == end - start:
+            self._table.write(start, value)
+        else:
+            self._table.delete(start, end - start)
+            self._table.insert(start, value)
+        self._modified(start, end, len(value), old)
+
+    def __delitem__(self, key):
+        '''
+        remove a slice of bytes
+        '''
+        self._check_writable()
+        if not isinstance(key, slice):
+            key = slice(key, key + 1 or None)
+        (start, end) = self._slice(key)
+        old = self._before(start, end)
+        self._table.delete(start, end - start)
+        self._modified(start, end, 0, old)
+
+    def view(self, start, end):
+        '''
+        produce a read-only view of the given range of the buffer, without copying if the
+        range lies within a single piece
+        '''
+        chunks = list(self._table.chunks(int(start), int(end)))
+        if len(chunks) == 1:
+            return chunks[0].toreadonly()
+        return memoryview(bytearray().join(chunks)).toreadonly()
+
+    def unpack_from(self, fmt, offset=0):
+        '''
+        unpack the given struct format from the buffer at the given offset
+        '''
+        offset = int(offset)
+        return struct.unpack_from(fmt, self._table.read(offset, offset + struct.calcsize(fmt)))
+
+    def pack_into(self, fmt, offset, *values):
+        '''
+        pack the given values in the given struct format into the buffer at the given offset
+        '''
+        self._check_writable()
+        (start, end) = (int(offset), int(offset) + struct.calcsize(fmt))
+        old = self._before(start, end)
+        self._table.write(start, struct.pack(fmt, *values))
+        self._modified(start, end, old=old)
+
+    def getbits(self, start, length):
+        '''
+        produce an integer from the given bit position and length
+        '''
+        first = start >> 3
+        last = (start + length + 7) >> 3
+        if last > len(self._table):
+            raise IndexError('bit range out of buffer bounds')
+
+        word = int.from_bytes(self._table.read(first, last), 'little')
+        return (word >> (start & 0x07)) & ((1 << length) - 1)
+
+    def setbits(self, start, value, length):
+        '''
+        set the given bits to the given value
+        '''
+        self._check_writable()
+        first = start >> 3
+        last = (start + length + 7) >> 3
+        if last > len(self._table):
+            raise IndexError('bit range out of buffer bounds')
+
+        shift = start & 0x07
+        mask = ((1 << length) - 1) << shift
+
+        word = int.from_bytes(self._table.read(first, last), 'little')
+        if self._journal is not None:
+            self._journal.bits(start, length, (word & mask) >> shift, value & (mask >> shift))
+
+        word = (word & ~mask) | ((value << shift) & mask)
+        self._table.write(first, word.to_bytes(last - first, 'little'))
+        self._modified(first, last)
+
+    def flush(self, backup=False, async_=False):
+        '''
+        write the data back to disk, with optional backup
+        '''
+        self._check_writable()
+
+        # mapped files can not be replaced on windows, so stop referring to the file first
+        if os.name == 'nt':
+            self._table.own(0, len(self._table))
+        return super().flush(backup, async_)
+
+    def _chunks(self):
+        '''
+        produce the data of the buffer as a sequence of pieces
+        '''
+        return self._table.chunks()
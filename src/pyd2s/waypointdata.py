@@ -3,7 +3,6 @@
 this module provides classes to manage waypoint data of a d2s save
 '''
 
-import struct
 from enum import Enum
 
 from pyd2s.gamedata import GameData
@@ -91,7 +90,7 @@ class WaypointData:
             '''
             produce the raw value of the waypoint data
             '''
-            low, high = struct.unpack_from('<LB', self._buffer, 643 + self._offset)
+            low, high = self._buffer.unpack_from('<LB', 643 + self._offset)
             return (high << 32) | low
 
         @_value.setter
@@ -101,7 +100,7 @@ class WaypointData:
             '''
             high = value >> 32
             low = value & 0xffffffff
-            struct.pack_into('<LB', self._buffer, 643 + self._offset, low, high)
+            self._buffer.pack_into('<LB', 643 + self._offset, low, high)
 
         def __getitem__(self, waypoint):
             '''
@@ -90,15 +90,16 @@ class Grail:
             res = self._sections['overflow'].place(item)
         return res
 
-    def flush(self, backup=False):
+    def flush(self, backup=False, async_=False):
         '''
         put all items into the stash file
         '''
-        for section in self._sections:
-            logging.debug('writing stash section %s', section)
-            self._sections[section].append_to(self._sss)
-        self.fix_flags()
-        self._sss.flush(backup)
+        with self._sss.transaction():
+            for section in self._sections:
+                logging.debug('writing stash section %s', section)
+                self._sections[section].append_to(self._sss)
+            self.fix_flags()
+        return self._sss.flush(backup, async_)
 
     def fix_flags(self):
         '''
@@ -342,7 +343,8 @@ key = "overflow"
 
     # if we reorganize, pull all items from the stash
     if args.reorganize:
-        items.extend(sss.clear())
+        with sss.transaction():
+            items.extend(sss.clear())
 
     # if we add from other, pull all items from those
     source_stashes = []
@@ -352,7 +354,8 @@ key = "overflow"
             if d2s.type in [SaveFile.Type.D2X, SaveFile.Type.SSS]:
                 # take all files from stash files
                 source_stashes.append(d2s)
-                items.extend(d2s.clear())
+                with d2s.transaction():
+                    items.extend(d2s.clear())
             if d2s.type == SaveFile.Type.D2S:
                 # this could get weird, since PlugY overwrites the stash inventory
                 # it could happen that we would pull items from the stash into itself
@@ -370,6 +373,9 @@ key = "overflow"
         if not grail.place(item):
             raise ValueError(f'unable to place item {item.short_str()}')
 
-    grail.flush(args.backup)
+    # write all stashes in the background, and wait for them to complete
+    writes = [grail.flush(args.backup, async_=True)]
     for stash in source_stashes:
-        stash.flush(args.backup)
+        writes.append(stash.flush(args.backup, async_=True))
+    for write in writes:
+        write.result()
@@ -223,6 +223,10 @@ def print_item_data(d2s):
     '''
     print item savefile information
     '''
+    # items are marked identified in memory before they are printed, the file itself is
+    # never written
+    d2s.make_writable()
+
     if d2s.type == SaveFile.Type.D2I:
         print('''\
 [[ Item Information ]]''')
@@ -323,6 +327,8 @@ def extract_items(d2s, dest):
     '''
     write test data files for creating test cases with real data
     '''
+    d2s.make_writable()
+
     items = []
     if d2s.type == SaveFile.Type.D2S:
         items = d2s.itemdata.pdata + d2s.itemdata.cdata + d2s.itemdata.mdata + d2s.itemdata.gdata
@@ -366,7 +372,7 @@ def pyd2s_stat(argv=None):
 
     needs_newline = False
 
-    d2s = pyd2s.SaveFile.open(path)
+    d2s = pyd2s.SaveFile.open(path, mode='r')
 
     if args.a or args.s:
         needs_newline = print_savefile_data(d2s, path)
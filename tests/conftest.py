@@ -0,0 +1,11 @@
+import pytest
+
+
+@pytest.fixture
+def stash_data():
+    # a shared stash with 100 gold, a rune and a magic ring on the first page, and an armor
+    # on the second
+    return bytes.fromhex(
+        '5353530030326400000002000000535401000000004a4d02004a4d1000a0000000002a071303024a'
+        '4d100080000000022a97e60602222200000f5180030050f21f535401000000004a4d01004a4d1000'
+        '80000000001a57970682aa2a00008ac003140ffe03')
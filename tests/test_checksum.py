@@ -0,0 +1,106 @@
+import random
+
+from pyd2s import checksum
+from pyd2s.savebuffer import SaveBuffer
+
+import pytest
+
+
+def reference_checksum(data):
+    data = bytearray(data)
+    data[0x0c:0x10] = bytes(4)
+
+    res = 0
+    for byte in data:
+        res = (((res << 1) | (res & 0x80000000 > 0)) + byte) & 0xffffffff
+    return res
+
+
+def checksum_inputs():
+    rng = random.Random(0)
+    yield pytest.param(bytes(5000), id='zeros')
+    yield pytest.param(b'\xff' * 5000, id='ones')
+    yield pytest.param(bytes(rng.randrange(256) for _ in range(100)), id='short')
+    for i in range(4):
+        data = bytearray()
+        while len(data) < 20000:
+            run = rng.choice([b'\xff', b'\x00', bytes((rng.randrange(256),))])
+            data += run * rng.randrange(1, 300)
+        yield pytest.param(bytes(data), id=f'runs-{i}')
+
+
+@pytest.mark.parametrize('data', list(checksum_inputs()))
+def test_compute_checksum(data):
+    assert checksum.compute_checksum(data) == reference_checksum(data)
+
+
+def test_compute_checksum_zero_runs(monkeypatch):
+    # runs of zero bytes in a zero state are skipped, instead of being stepped over exactly
+    # a few bytes at a time
+    stepped = []
+
+    def counting_loop(data, state=0):
+        stepped.append(len(data))
+        return checksum_loop(data, state)
+
+    checksum_loop = checksum._checksum_loop
+    monkeypatch.setattr(checksum, '_checksum_loop', counting_loop)
+    data = bytes(1 << 20) + bytes(range(1, 256))
+    assert checksum.compute_checksum(data) == reference_checksum(data)
+    assert sum(stepped) <= 256
+
+
+def test_verify_checksum():
+    data = bytearray(random.Random(1).randrange(256) for _ in range(2048))
+    data[0x0c:0x10] = reference_checksum(data).to_bytes(4, 'little')
+    assert checksum.verify_checksum(data)
+
+    data[100] ^= 1
+    assert not checksum.verify_checksum(data)
+
+
+@pytest.mark.parametrize('pieces', [False, True])
+def test_incremental_checksum(pieces):
+    rng = random.Random(2)
+    buffer = SaveBuffer(bytes(rng.randrange(256) for _ in range(3 * 4096 + 100)))
+    if pieces:
+        buffer.use_piece_table()
+    assert buffer.checksum() == reference_checksum(bytes(buffer))
+
+    for _ in range(100):
+        start = rng.randrange(len(buffer) - 8)
+        action = rng.randrange(5)
+        if action == 0:
+            buffer.setbits(start * 8 + rng.randrange(8), rng.randrange(256), 8)
+        elif action == 1:
+            buffer[start] = rng.randrange(256)
+        elif action == 2:
+            buffer.pack_into('<L', start, rng.randrange(1 << 32))
+        elif action == 3:
+            buffer.insert_bytes(start, rng.randrange(1, 64))
+        else:
+            buffer.remove_bytes(start, rng.randrange(1, 64))
+
+        if rng.random() < 0.1:
+            buffer.pack_into('<L', 0x0c, buffer.checksum())
+        assert buffer.checksum() == reference_checksum(bytes(buffer))
+
+
+def test_incremental_checksum_interval(monkeypatch):
+    rng = random.Random(3)
+    buffer = SaveBuffer(bytes(rng.randrange(256) for _ in range(6000)))
+    assert buffer.checksum() == reference_checksum(bytes(buffer))
+
+    processed = []
+
+    def counting_advance(data, state=0):
+        processed.append(len(data))
+        return advance(data, state)
+
+    advance = checksum._advance
+    monkeypatch.setattr(checksum, '_advance', counting_advance)
+
+    # an edit of the mercenary fields in the header rescans about the data behind it
+    buffer.pack_into('<L', 187, 0x12345)
+    assert buffer.checksum() == reference_checksum(bytes(buffer))
+    assert len(buffer) - 187 <= sum(processed) < len(buffer) - 100
@@ -0,0 +1,75 @@
+from pyd2s.item import Item
+from pyd2s.diff import changed_runs, diff
+
+import pytest
+
+# a shared stash with a rune and a magic ring on page 'one', and an armor on page 'two'
+OLD = bytes.fromhex(
+    '53535300303264000000020000005354010000006f6e65004a4d02004a4d1000a0000000002a0713'
+    '03024a4d100080000000022a97e60602222200000f5180030050f21f53540100000074776f004a4d'
+    '01004a4d100080000000001a57970682aa2a00008ac003140ffe03')
+
+# the same stash with the rune removed, the ring strength changed from 5 to 7, the armor
+# moved, another rune added, and the second page renamed to 'tw0'
+NEW = bytes.fromhex(
+    '53535300303264000000020000005354010000006f6e65004a4d01004a4d100080000000022a97e6'
+    '0602222200000f5180030070f21f535401000000747730004a4d02004a4d100080000000061a5797'
+    '0682aa2a00008ac003140ffe034a4d1000a0000000002a07230302')
+
+
+@pytest.mark.parametrize(('old', 'new', 'runs'), [
+    (b'', b'', []),
+    (b'abcdef', b'abcdef', []),
+    (b'abcdef', b'abXdeYZ', [(2, 3), (5, 7)]),
+    (bytes(10000), bytes(5000) + b'\x01' + bytes(4999), [(5000, 5001)]),
+    (bytes(100), bytes(64), [(64, 100)]),
+])
+def test_changed_runs(old, new, runs):
+    assert changed_runs(old, new) == runs
+
+
+def test_diff():
+    assert not diff(OLD, OLD)
+
+    res = diff(OLD, NEW)
+    assert [item.type for item in res.added] == ['r02']
+    assert [item.type for item in res.removed] == ['r01']
+
+    (ring, armor) = res.changed
+    assert ring.new.uid == 0x4444
+    assert ring.fields == {'enhancements.strength': (5, 7)}
+    assert armor.new.uid == 0x5555
+    assert list(armor.fields) == ['location']
+    assert armor.fields['location'][1].get_pos() == (3, 0)
+
+    # the item count of both pages, and the page name
+    assert res.data == [((26, 27), (26, 27)), ((76, 77), (62, 63)), ((80, 81), (66, 67))]
+
+
+def test_diff_builds_differing_items(monkeypatch):
+    built = []
+    from_data = Item.from_data.__func__
+
+    def counting_from_data(cls, buffer, offset):
+        built.append(offset)
+        return from_data(cls, buffer, offset)
+
+    monkeypatch.setattr(Item, 'from_data', classmethod(counting_from_data))
+
+    # only the ring differs, so the rune and the armor are not built on either side
+    new = OLD.replace(bytes.fromhex('0050f21f'), bytes.fromhex('0070f21f'))
+    res = diff(OLD, new)
+    assert not res.added and not res.removed and not res.data
+    (ring,) = res.changed
+    assert ring.fields == {'enhancements.strength': (5, 7)}
+    assert built == [42, 42]
+
+
+def test_diff_raw_data():
+    # a bit that is not decoded is reported as a copy of the raw data
+    new = bytearray(OLD)
+    new[-1] ^= 0x80
+    (change,) = diff(OLD, new).changed
+    (old_data, new_data) = change.fields['raw_data']
+    assert isinstance(old_data, bytes) and isinstance(new_data, bytes)
+    assert old_data[:-1] == new_data[:-1] and old_data[-1] ^ new_data[-1] == 0x80
@@ -0,0 +1,28 @@
+from pyd2s import SaveFile
+from pyd2s.itemlocation import ItemLocation
+
+
+def test_fork(stash_data):
+    stash = SaveFile.from_data(stash_data)
+    # items constructed before forking are shared with the fork
+    (_, original) = stash.pages[0].idata
+    fork = stash.fork()
+
+    (rune, ring) = fork.pages[0].idata
+    assert ring._attributes is original._attributes
+    assert rune._buffer is fork._buffer
+
+    fork.pages[0].take(rune)
+    rune.location = ItemLocation.stashed((5, 5))
+    fork.pages[1].put(rune)
+
+    def types(save):
+        return [[item.type for item in page.idata] for page in save.pages]
+
+    assert types(fork) == [['rin'], ['qui', 'r01']]
+    assert types(stash) == [['r01', 'rin'], ['qui']]
+    assert bytes(stash._buffer) == stash_data
+
+    reparsed = SaveFile.from_data(bytes(fork._buffer))
+    assert types(reparsed) == [['rin'], ['qui', 'r01']]
+    assert reparsed.pages[1].idata[1].location.get_pos() == (5, 5)
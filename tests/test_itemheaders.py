@@ -0,0 +1,25 @@
+import pytest
+
+from pyd2s import SaveFile, itemheaders
+from pyd2s.itemheaders import decode_headers, item_offsets
+
+
+@pytest.mark.parametrize('vectorized', [True, False])
+def test_decode_headers(monkeypatch, vectorized, stash_data):
+    if not vectorized:
+        monkeypatch.setattr(itemheaders, 'numpy', None)
+
+    stash = SaveFile.from_data(stash_data)
+    offsets = item_offsets(stash)
+    headers = decode_headers([stash, (stash_data, offsets[:1])])
+
+    items = stash.pages[0].idata + stash.pages[1].idata
+    assert list(headers['source']) == [0, 0, 0, 1]
+    assert list(headers['offset']) == offsets + offsets[:1]
+    assert list(headers['type']) == [item.type for item in items] + ['r01']
+    assert list(headers['extended']) == [False, True, True, False]
+    assert list(headers['uid'][1:3]) == [item.uid for item in items[1:]]
+    assert list(headers['ilvl'][1:3]) == [item.ilvl for item in items[1:]]
+    assert list(headers['quality']) == [0] + [item.quality.value for item in items[1:]] + [0]
+    assert [(headers['column'][i], headers['row'][i]) for i in range(3)] == \
+        [tuple(item.location.get_pos()) for item in items]
@@ -0,0 +1,28 @@
+from pyd2s.gamedata import GameData
+from pyd2s.itemstat import ItemStat
+from pyd2s.savebuffer import SaveBuffer
+
+
+def stat_list(*stats):
+    (word, pos) = (0, 0)
+    for (eid, param, value) in stats:
+        (param_bits, value_bits, add, _, _) = GameData.itemstat_decoders[eid]
+        for (width, field) in ((9, eid), (param_bits, param), (value_bits, value + add)):
+            word |= field << pos
+            pos += width
+    word |= 0x1ff << pos
+    return SaveBuffer(word.to_bytes((pos + 9 + 7) // 8, 'little'))
+
+
+def test_read_list():
+    assert GameData.itemstat_decoders[107][:4] == (9, 3, 0, 1)
+
+    # all four resistances form a group, a single one does not
+    buffer = stat_list((39, 0, 10), (41, 0, 10), (43, 0, 10), (45, 0, 10), (107, 30, 2),
+                       (39, 0, 5))
+    (resists, skill, fire) = ItemStat.read_list(buffer.bit_pointer(0))
+
+    assert [child.stat for child in resists.children] == \
+        ['lightresist', 'coldresist', 'poisonresist']
+    assert (skill.stat, skill.param, skill.value) == ('item_singleskill', 30, 2)
+    assert (fire.stat, fire.value, fire.children) == ('fireresist', 5, ())
@@ -0,0 +1,635 @@
+import gc
+import random
+import weakref
+import itertools
+import threading
+import tracemalloc
+
+from pyd2s import SaveFile
+from pyd2s.changes import ChangedRanges
+from pyd2s.savebuffer import SaveBuffer
+
+import pytest
+
+
+def reference_getbits(data, start, length):
+    res = 0
+    for i in range(length):
+        pos = start + i
+        res |= ((data[pos >> 3] & (1 << (pos & 0x07))) != 0) << i
+    return res
+
+
+def reference_setbits(data, start, value, length):
+    for i in range(length):
+        pos = start + i
+        data[pos >> 3] ^= (-((value >> i) & 0x1) ^ data[pos >> 3]) & (1 << (pos & 0x07))
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_getbits(seed):
+    rng = random.Random(seed)
+    data = bytes(rng.randrange(256) for _ in range(64))
+    buffer = SaveBuffer(data)
+
+    for _ in range(500):
+        length = rng.randrange(0, 65)
+        start = rng.randrange(0, len(data) * 8 - length + 1)
+        assert buffer.getbits(start, length) == reference_getbits(data, start, length)
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_setbits(seed):
+    rng = random.Random(seed)
+    data = bytearray(rng.randrange(256) for _ in range(64))
+    buffer = SaveBuffer(data)
+
+    for _ in range(500):
+        length = rng.randrange(0, 65)
+        start = rng.randrange(0, len(data) * 8 - length + 1)
+        value = rng.randrange(-(1 << 64), 1 << 64)
+        reference_setbits(data, start, value, length)
+        buffer.setbits(start, value, length)
+        assert buffer == data
+
+
+def test_bits_out_of_bounds():
+    buffer = SaveBuffer(bytes(4))
+
+    with pytest.raises(IndexError):
+        buffer.getbits(30, 3)
+    with pytest.raises(IndexError):
+        buffer.setbits(30, 0, 3)
+
+
+def test_read_write_fields():
+    widths = (3, 4, 4, 4, 3, 32)
+    values = (1, 0, 9, 3, 5, 0x20726f6d)
+
+    buffer = SaveBuffer(bytes(16))
+    buffer.bit_pointer(5).write_fields(widths, values)
+
+    ptr = buffer.bit_pointer(5)
+    assert ptr.read_fields(widths) == values
+    assert ptr.distance == sum(widths)
+
+    ptr = buffer.bit_pointer(5)
+    assert tuple(ptr.read(width) for width in widths) == values
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_dynamic_offsets(seed):
+    rng = random.Random(seed)
+    buffer = SaveBuffer(bytes(4096))
+
+    offsets = [buffer.dynamic_offset(rng.randrange(len(buffer))) for _ in range(2000)]
+    expected = [int(offset) for offset in offsets]
+
+    for _ in range(200):
+        start = rng.randrange(len(buffer))
+        length = rng.randrange(1, 64)
+        if rng.random() < 0.5:
+            buffer.insert_bytes(start, length)
+            expected = [value + length if value >= start else value for value in expected]
+        else:
+            length = min(length, len(buffer) - start)
+            buffer.remove_bytes(start, length)
+            expected = [value - length if value >= start + length
+                        else min(value, start) for value in expected]
+
+        if rng.random() < 0.2:
+            index = rng.randrange(len(offsets))
+            buffer.remove_dynamic_offset(offsets.pop(index))
+            expected.pop(index)
+
+        assert [int(offset) for offset in offsets] == expected
+
+
+def test_dynamic_offset_anchor():
+    buffer = SaveBuffer(bytes(16))
+    before = buffer.dynamic_offset(8)
+    anchor = buffer.dynamic_offset(8)
+    after = buffer.dynamic_offset(8)
+    behind = buffer.dynamic_offset(12)
+
+    buffer.insert_bytes(anchor, 4)
+    assert (int(before), int(anchor), int(after), int(behind)) == (8, 12, 8, 16)
+
+    buffer.insert_bytes(8, 2)
+    assert (int(before), int(anchor), int(after), int(behind)) == (10, 14, 10, 18)
+
+
+def test_dynamic_offset_anchor_buckets(monkeypatch):
+    monkeypatch.setattr(SaveBuffer.OffsetRegistry, 'BUCKET_SIZE', 2)
+    buffer = SaveBuffer(bytes(32))
+    (first, anchor, behind) = (buffer.dynamic_offset(value) for value in (10, 10, 20))
+
+    # the anchor moves behind the offset it shared a position with, into another bucket
+    buffer.insert_bytes(first, 5)
+    buffer.insert_bytes(12, 1)
+    assert (int(first), int(anchor), int(behind)) == (16, 10, 26)
+
+
+@pytest.mark.parametrize('bucket_size', [2, 8, 256])
+@pytest.mark.parametrize('seed', range(4))
+def test_dynamic_offsets_anchored(monkeypatch, seed, bucket_size):
+    monkeypatch.setattr(SaveBuffer.OffsetRegistry, 'BUCKET_SIZE', bucket_size)
+    rng = random.Random(seed)
+    buffer = SaveBuffer(bytes(64))
+
+    # few distinct positions, so that many offsets are equal
+    offsets = [buffer.dynamic_offset(rng.randrange(len(buffer))) for _ in range(1000)]
+    expected = [int(offset) for offset in offsets]
+
+    for _ in range(300):
+        length = rng.randrange(1, 8)
+        if rng.random() < 0.5:
+            index = rng.randrange(len(offsets))
+            start = expected[index]
+            buffer.insert_bytes(offsets[index], length)
+            expected = [value + length if value > start or i == index else value
+                        for (i, value) in enumerate(expected)]
+        elif rng.random() < 0.5:
+            start = rng.randrange(len(buffer))
+            buffer.insert_bytes(start, length)
+            expected = [value + length if value >= start else value for value in expected]
+        else:
+            start = rng.randrange(len(buffer))
+            length = min(length, len(buffer) - start)
+            buffer.remove_bytes(start, length)
+            expected = [value - length if value >= start + length
+                        else min(value, start) for value in expected]
+
+        assert [int(offset) for offset in offsets] == expected
+
+
+def test_dynamic_offsets_released():
+    # a d2i file holding a single rune
+    data = bytes.fromhex('4a4d600000004a4d1000a0000000222207130302')
+    released = itertools.count()
+
+    def load():
+        save = SaveFile.from_data(data)
+        assert save.item.type == 'r01'
+        # only the offsets of the item of the file are referenced
+        assert len(save._buffer._dynamic_offsets) <= 2
+        assert save._buffer._dynamic_offsets.buckets == 1
+        weakref.finalize(save._buffer, next, released)
+
+    load()
+    gc.collect()
+    tracemalloc.start()
+    (baseline, _) = tracemalloc.get_traced_memory()
+
+    for _ in range(10000):
+        load()
+    gc.collect()
+
+    (current, _) = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # every file is released along with its buffer and offset registry
+    assert next(released) == 10001
+    assert current - baseline < 64 * 1024
+
+
+@pytest.mark.parametrize('block_size', [4, 128])
+@pytest.mark.parametrize('seed', range(4))
+def test_piece_table(monkeypatch, seed, block_size):
+    monkeypatch.setattr(SaveBuffer.PieceTable, 'BLOCK_SIZE', block_size)
+    rng = random.Random(seed)
+    data = bytearray(rng.randrange(256) for _ in range(256))
+    buffer = SaveBuffer(data)
+    buffer.use_piece_table()
+
+    for _ in range(300):
+        start = rng.randrange(len(data))
+        length = rng.randrange(1, 16)
+        action = rng.randrange(4)
+        if action == 0:
+            data[start:start] = bytes(length)
+            buffer.insert_bytes(start, length)
+        elif action == 1:
+            del data[start:start + length]
+            buffer.remove_bytes(start, length)
+        elif action == 2:
+            length = min(length * 8, len(data) * 8 - start)
+            value = rng.randrange(1 << length)
+            reference_setbits(data, start, value, length)
+            buffer.setbits(start, value, length)
+        else:
+            assert buffer.getbits(start, length) == reference_getbits(data, start, length)
+            assert buffer[start:start + length] == data[start:start + length]
+
+        assert len(buffer) == len(data)
+
+    assert bytes(buffer) == data
+    assert buffer.unpack_from('<L', 4) == SaveBuffer(data).unpack_from('<L', 4)
+
+    buffer.materialize()
+    assert type(buffer) is SaveBuffer
+    assert buffer == data
+
+
+def test_transaction():
+    buffer = SaveBuffer(bytes(range(64)))
+    end = buffer.dynamic_offset(64)
+
+    with buffer.transaction():
+        with buffer.transaction():
+            buffer.insert_bytes(8, 4)
+            buffer.remove_bytes(32, 8)
+        assert type(buffer) is not SaveBuffer
+        buffer.setbits(8 * 8, 0xdeadbeef, 32)
+        assert int(end) == 60
+
+    assert type(buffer) is SaveBuffer
+    assert buffer == (bytes(range(8)) + bytes.fromhex('efbeadde')
+                      + bytes(range(8, 28)) + bytes(range(36, 64)))
+
+
+def test_subclass_representations(tmp_path):
+    class CountingBuffer(SaveBuffer):
+        def setbits(self, start, value, length):
+            self.calls = getattr(self, 'calls', 0) + 1
+            super().setbits(start, value, length)
+
+    path = tmp_path / 'save.bin'
+    path.write_bytes(bytes(range(64)))
+
+    buffer = CountingBuffer(bytes(range(64)))
+    with buffer.transaction():
+        assert isinstance(buffer, CountingBuffer) and buffer._table is not None
+        buffer.insert_bytes(8, 4)
+        buffer.setbits(0, 0xff, 8)
+    assert type(buffer) is CountingBuffer
+    assert buffer.calls == 1 and buffer[0] == 0xff
+
+    forked = buffer.fork()
+    forked.setbits(8, 0xff, 8)
+    assert isinstance(forked, CountingBuffer) and forked.calls == 1
+    forked.materialize()
+    assert type(forked) is CountingBuffer
+
+    mapped = CountingBuffer.open(str(path), mode='r')
+    assert isinstance(mapped, CountingBuffer) and mapped == bytes(range(64))
+    assert type(mapped) is type(CountingBuffer.open(str(path), pieces=True))
+
+
+def test_readonly_mapping(tmp_path):
+    path = tmp_path / 'save.bin'
+    data = bytes(range(256)) * 40
+    path.write_bytes(data)
+
+    buffer = SaveBuffer.open(str(path), mode='r')
+    assert buffer.readonly
+    assert len(buffer) == len(data)
+    assert buffer[100:108] == data[100:108]
+    assert buffer.getbits(8 * 300 + 3, 20) == reference_getbits(data, 8 * 300 + 3, 20)
+
+    with pytest.raises(PermissionError):
+        buffer.setbits(0, 1, 1)
+    with pytest.raises(PermissionError):
+        buffer.insert_bytes(0, 4)
+    with pytest.raises(PermissionError):
+        buffer.flush()
+
+    buffer.make_writable()
+    buffer.setbits(8 * 5000, 0xff, 8)
+    buffer.insert_bytes(10, 2)
+    assert path.read_bytes() == data
+
+    buffer.flush()
+    expected = bytearray(data)
+    expected[5000] = 0xff
+    expected[10:10] = bytes(2)
+    assert path.read_bytes() == expected
+
+
+@pytest.mark.parametrize('pieces', [False, True])
+def test_view(pieces):
+    buffer = SaveBuffer(bytes(range(32)))
+    if pieces:
+        buffer.use_piece_table()
+
+    buffer.insert_bytes(buffer.dynamic_offset(4), b'\xaa\xbb')
+    view = buffer.view(2, 8)
+    assert isinstance(view, memoryview) and view.readonly
+    assert view == bytes.fromhex('0203aabb0405')
+
+    if not pieces:
+        with pytest.raises(BufferError):
+            buffer.remove_bytes(0, 1)
+    view.release()
+    buffer.remove_bytes(0, 1)
+    assert buffer[:7] == bytes.fromhex('010203aabb0405')
+
+
+@pytest.mark.parametrize('pieces', [False, True])
+def test_bytes_operations(tmp_path, pieces):
+    data = b'JM\x10\x00' + bytes(range(32)) + b'JM'
+    buffer = SaveBuffer(data)
+    if pieces:
+        buffer.use_piece_table()
+        buffer.insert_bytes(4, b'ab')
+        buffer.remove_bytes(4, 2)
+
+    assert (len(buffer), bytes(buffer), list(buffer)) == (len(data), data, list(data))
+    assert buffer == data and buffer == SaveBuffer(data) and buffer != data[1:]
+    assert buffer.hex() == data.hex() and repr(buffer) == f'{type(buffer).__name__}({data!r})'
+    assert (buffer.find(b'JM', 1), buffer.count(b'JM')) == (36, 2)
+    assert b'JM' in buffer and 7 in buffer and b'MJ' not in buffer
+    assert buffer.startswith(b'JM') and buffer.endswith(b'JM')
+    assert buffer[:2].decode('ascii') == SaveBuffer(b'JM').decode('ascii') == 'JM'
+
+    # the buffer is not a bytes-like object, its data is accessed through views or copies
+    with pytest.raises(TypeError):
+        memoryview(buffer)
+    with open(tmp_path / 'data.bin', 'wb') as output:
+        with pytest.raises(TypeError):
+            output.write(buffer)
+        output.write(buffer.view(0, len(buffer)))
+    assert (tmp_path / 'data.bin').read_bytes() == data
+
+
+@pytest.mark.parametrize('name', ['', 'a', 'Tester', 'ABCDEFGHIJKLMNO', 'x' * 40])
+def test_read_write_string(name):
+    buffer = SaveBuffer(bytes(64))
+    ptr = buffer.bit_pointer(3)
+    ptr.write_string(name)
+    assert ptr.distance == (len(name) + 1) * 7
+
+    data = bytearray(64)
+    for (i, char) in enumerate(name.encode('ascii')):
+        reference_setbits(data, 3 + i * 7, char, 7)
+    assert buffer == data
+
+    ptr = buffer.bit_pointer(3)
+    assert ptr.read_string() == name
+    assert ptr.distance == (len(name) + 1) * 7
+
+
+def test_read_string_out_of_bounds():
+    buffer = SaveBuffer(b'\xff' * 4)
+    with pytest.raises(IndexError):
+        buffer.bit_pointer(0).read_string()
+
+
+@pytest.mark.parametrize('pieces', [False, True])
+def test_flush(tmp_path, monkeypatch, pieces):
+    path = tmp_path / 'save.bin'
+    path.write_bytes(bytes(64))
+    path.chmod(0o640)
+
+    buffer = SaveBuffer.open(str(path), pieces=pieces)
+    buffer.insert_bytes(8, b'abcd')
+    buffer.flush(backup=True)
+    assert path.read_bytes() == bytes(8) + b'abcd' + bytes(56)
+    assert path.stat().st_mode & 0o777 == 0o640
+
+    backups = [entry for entry in tmp_path.iterdir() if entry != path]
+    assert len(backups) == 1 and backups[0].read_bytes() == bytes(64)
+
+    buffer.setbits(0, 0xff, 8)
+    future = buffer.flush(async_=True)
+    buffer.setbits(8, 0xff, 8)
+    future.result()
+    assert path.read_bytes() == b'\xff' + bytes(7) + b'abcd' + bytes(56)
+
+    def failing_replace(src, dst):
+        raise OSError('disk full')
+
+    monkeypatch.setattr('os.replace', failing_replace)
+    with pytest.raises(OSError):
+        buffer.flush()
+    assert path.read_bytes() == b'\xff' + bytes(7) + b'abcd' + bytes(56)
+    assert sorted(tmp_path.iterdir()) == sorted([path] + backups)
+
+    # the changes of a failed background write are restored, in their current positions
+    buffer.setbits(16, 0xff, 8)
+    future = buffer.flush(async_=True)
+    with pytest.raises(OSError):
+        future.result()
+    buffer.insert_bytes(0, b'xy')
+    assert list(buffer.changes) == [(0, 2), (3, 5)]
+    buffer.insert_bytes(40, b'xy')
+    assert list(buffer.changes) == [(0, 2), (3, 5), (40, 42)]
+
+
+@pytest.mark.parametrize('pieces', [False, True])
+def test_changes(pieces):
+    buffer = SaveBuffer(bytes(64))
+    if pieces:
+        buffer.use_piece_table()
+    assert not buffer.changes
+
+    buffer.setbits(8 * 10, 0xff, 8)
+    buffer.pack_into('<H', 11, 0xffff)
+    buffer.pack_into('<H', 30, 0xffff)
+    assert list(buffer.changes) == [(10, 13), (30, 32)]
+    assert not buffer.changes.structural
+
+    buffer.insert_bytes(20, b'abcd')
+    buffer.remove_bytes(0, 2)
+    assert list(buffer.changes) == [(0, 0), (8, 11), (18, 22), (32, 34)]
+    assert buffer.changes.structural
+    assert buffer.changes.size == 9
+
+
+@pytest.mark.parametrize('bucket_size', [2, 128])
+@pytest.mark.parametrize('seed', range(4))
+def test_changes_cover_edits(monkeypatch, seed, bucket_size):
+    monkeypatch.setattr(ChangedRanges, 'BUCKET_SIZE', bucket_size)
+    rng = random.Random(seed)
+    buffer = SaveBuffer(bytes(256))
+    origin = list(range(256))
+
+    for _ in range(200):
+        start = rng.randrange(len(origin))
+        length = rng.randrange(1, 16)
+        action = rng.randrange(3)
+        if action == 0:
+            buffer.insert_bytes(start, length)
+            origin[start:start] = [None] * length
+        elif action == 1:
+            buffer.remove_bytes(start, length)
+            del origin[start:start + length]
+        else:
+            length = min(length, len(origin) - start)
+            buffer[start:start + length] = bytes(length)
+            origin[start:start + length] = [None] * length
+
+    ranges = list(buffer.changes)
+    assert len(buffer.changes) == len(ranges)
+    assert all(end < start for ((_, end), (start, _)) in zip(ranges, ranges[1:]))
+    for (pos, value) in enumerate(origin):
+        if value is None:
+            assert any(start <= pos < end for (start, end) in ranges)
+
+
+@pytest.mark.parametrize('bucket_size', [2, 128])
+def test_changes_collected(monkeypatch, bucket_size):
+    monkeypatch.setattr(ChangedRanges, 'BUCKET_SIZE', bucket_size)
+    rng = random.Random(0)
+    buffer = SaveBuffer(bytes(1024))
+    changed = set()
+
+    for count in range(1, 301):
+        start = rng.randrange(1024 * 8 - 7)
+        buffer.setbits(start, 0x55, 7)
+        buffer.setbits(start, 0x2a, 7)
+        changed.update(range(start >> 3, (start + 14) >> 3))
+        if count % 100 == 0:
+            runs = [pos for pos in sorted(changed) if pos - 1 not in changed]
+            ends = [pos + 1 for pos in sorted(changed) if pos + 1 not in changed]
+            assert list(buffer.changes) == list(zip(runs, ends))
+            assert not buffer.changes.structural
+
+
+def test_flush_async_failure(tmp_path, monkeypatch):
+    path = tmp_path / 'save.bin'
+    path.write_bytes(bytes(64))
+    release = threading.Event()
+
+    def failing_replace_file(path, chunks, backup=False):
+        release.wait()
+        raise OSError('disk full')
+
+    monkeypatch.setattr('pyd2s.savebuffer.replace_file', failing_replace_file)
+    buffer = SaveBuffer.open(str(path))
+    buffer[10:12] = b'ab'
+    future = buffer.flush(async_=True)
+    assert not buffer.changes
+
+    # edits made while the write is pending move the set aside changes along
+    buffer.insert_bytes(0, 4)
+    buffer[40] = 1
+    release.set()
+    with pytest.raises(OSError):
+        future.result()
+    assert list(buffer.changes) == [(0, 4), (14, 16), (40, 41)]
+    assert buffer.changes.structural
+
+
+def test_flush_unchanged(tmp_path):
+    path = tmp_path / 'save.bin'
+    path.write_bytes(bytes(16))
+    path.touch()
+    inode = path.stat().st_ino
+
+    buffer = SaveBuffer.open(str(path))
+    buffer.flush()
+    assert buffer.flush(async_=True).result() is None
+    assert path.stat().st_ino == inode
+
+    buffer[3] = 1
+    buffer.flush()
+    assert path.stat().st_ino != inode
+    assert not buffer.changes
+
+
+@pytest.mark.parametrize('pieces', [False, True])
+def test_fork(pieces):
+    data = bytes(range(256)) * 64
+    buffer = SaveBuffer(data)
+    if pieces:
+        buffer.use_piece_table()
+        buffer.insert_bytes(16, b'abcd')
+        data = data[:16] + b'abcd' + data[16:]
+
+    fork = buffer.fork()
+    fork.setbits(8 * 10000, 0, 8)
+    fork.remove_bytes(0, 4)
+    buffer.setbits(8 * 17, 0, 8)
+    assert bytes(buffer) == data[:17] + b'\x00' + data[18:]
+    assert bytes(fork) == data[4:10000] + b'\x00' + data[10001:]
+
+    # only the modified page has been copied
+    assert fork._table.private == 4096
+
+
+@pytest.mark.parametrize(('seed', 'pieces'), [(0, False), (1, False), (2, True), (3, True)])
+def test_journal(seed, pieces):
+    rng = random.Random(seed)
+    buffer = SaveBuffer(bytes(rng.randrange(256) for _ in range(256)))
+    if pieces:
+        buffer.use_piece_table()
+    journal = buffer.record()
+
+    snapshots = [bytes(buffer)]
+    for _ in range(50):
+        for _ in range(rng.randrange(1, 4)):
+            start = rng.randrange(len(buffer))
+            length = rng.randrange(1, 16)
+            action = rng.randrange(4)
+            if action == 0:
+                buffer.insert_bytes(start, bytes(rng.randrange(256) for _ in range(length)))
+            elif action == 1:
+                buffer.remove_bytes(start, length)
+            elif action == 2:
+                length = min(length * 4, len(buffer) * 8 - start)
+                buffer.setbits(start, rng.randrange(1 << length), length)
+            else:
+                buffer.pack_into('<B', start, rng.randrange(256))
+        journal.checkpoint()
+
+        # steps that did not change anything are dropped
+        if bytes(buffer) != snapshots[-1]:
+            snapshots.append(bytes(buffer))
+
+    for snapshot in reversed(snapshots[:-1]):
+        journal.undo()
+        assert bytes(buffer) == snapshot
+    assert not journal.can_undo
+
+    for snapshot in snapshots[1:]:
+        journal.redo()
+        assert bytes(buffer) == snapshot
+    assert not journal.can_redo
+
+
+def test_journal_squash():
+    buffer = SaveBuffer(bytes(1024))
+    journal = buffer.record(max_size=256)
+
+    for value in range(100):
+        buffer.setbits(13, value, 7)
+    buffer.setbits(40, 0, 3)
+    journal.checkpoint()
+    assert journal.size < 64
+
+    buffer.insert_bytes(0, 4)
+    buffer.pack_into('<L', 0, 0xdeadbeef)
+    journal.undo()
+    assert len(buffer) == 1024 and buffer.getbits(13, 7) == 99
+
+    # the first step is dropped to stay within the size limit
+    buffer.insert_bytes(0, bytes(240))
+    journal.checkpoint()
+    journal.undo()
+    assert len(buffer) == 1024 and not journal.can_undo
+    with pytest.raises(IndexError):
+        journal.undo()
+
+
+def test_journal_truncated():
+    buffer = SaveBuffer(bytes(1024))
+    journal = buffer.record(max_size=128)
+
+    buffer.setbits(13, 0x55, 7)
+    journal.checkpoint()
+
+    # a step exceeding the size limit drops all steps, and is not recorded up to the next
+    # checkpoint
+    buffer.insert_bytes(0, bytes(200))
+    buffer.setbits(8 * 300, 0xff, 8)
+    assert not journal.can_undo and journal.size == 0
+    with pytest.raises(IndexError):
+        journal.undo()
+    assert len(buffer) == 1224 and buffer[300] == 0xff
+
+    buffer.setbits(8 * 301, 0xff, 8)
+    journal.checkpoint()
+    journal.undo()
+    assert buffer[301] == 0 and buffer[300] == 0xff
+    assert not journal.can_undo
@@ -0,0 +1,138 @@
+import struct
+
+import pytest
+
+from pyd2s import SaveFile
+from pyd2s.item import Item
+from pyd2s.character import Character, CharacterClass
+
+Stat = Character.StatData.CharacterStat
+
+
+def character(name, level, gold, items=()):
+    data = bytearray(765)
+    struct.pack_into('<LL', data, 0, 0xaa55aa55, 0x60)
+    data[20:20 + len(name)] = name.encode('ascii')
+    data[36] = 0x24
+    data[40] = CharacterClass.NECROMANCER.value
+    data[43] = level
+    data[335:339] = b'Woo!'
+    data[633:635] = b'WS'
+
+    (word, pos) = (int.from_bytes(b'gf', 'little'), 16)
+    for (stat, value) in ((Stat.LEVEL, level), (Stat.GOLD, gold)):
+        word |= (stat.value | value << 9) << pos
+        pos += 9 + stat.bits
+    word |= 0x1ff << pos
+    data += word.to_bytes((pos + 9 - 1) // 8 + 1, 'little')
+
+    # skills, player items, corpse items, no mercenary and no golem
+    data += b'if' + bytes(30) + b'JM' + struct.pack('<H', len(items)) + b''.join(items)
+    return bytes(data + b'JM\0\0jfkf\0')
+
+
+def test_peek(tmp_path, stash_data):
+    path = tmp_path / 'Tester.d2s'
+    path.write_bytes(character('Tester', 42, 1234))
+
+    summary = SaveFile.peek(path)
+    assert summary.type == SaveFile.Type.D2S
+    assert (summary.name, summary.character_class, summary.level) == \
+        ('Tester', CharacterClass.NECROMANCER, 42)
+    assert (summary.is_expansion, summary.is_hardcore, summary.has_died) == (True, True, False)
+    assert (summary.stats[Stat.GOLD], summary.stats[Stat.EXPERIENCE]) == (1234, 0)
+    assert summary.page_count is None
+
+    path = tmp_path / 'shared.sss'
+    path.write_bytes(stash_data)
+
+    summary = SaveFile.peek(path)
+    assert (summary.type, summary.version) == (SaveFile.Type.SSS, 2)
+    assert (summary.page_count, summary.stored_gold) == (2, 100)
+    assert summary.name is None and summary.stats is None
+    assert summary.page_count == len(SaveFile.open(path).pages)
+
+
+def test_lazy_items(stash_data):
+    items = [bytes(item.raw_data) for page in SaveFile.from_data(stash_data).pages
+             for item in page.idata]
+    save = SaveFile.from_data(character('Tester', 42, 1234, items))
+
+    pdata = save.itemdata.pdata
+    assert (len(pdata), pdata.constructed) == (3, 0)
+    assert pdata[1].type == 'rin' and pdata.constructed == 1
+
+    # the offsets of the items not yet constructed follow the edits of the buffer
+    rune = pdata[0]
+    rune.detach()
+    del pdata[0]
+    assert [item.type for item in pdata] == ['rin', 'qui']
+    assert [bytes(item.raw_data) for item in pdata] == items[1:]
+    assert pdata + save.itemdata.mdata == list(pdata)
+
+    fork = SaveFile.from_data(character('Tester', 42, 1234, items)).fork()
+    assert fork.itemdata.pdata.constructed == 0
+    assert all(item._buffer is fork._buffer for item in fork.itemdata.pdata)
+
+
+def test_scan_items(stash_data):
+    stash = SaveFile.from_data(stash_data)
+    (first, second) = stash.pages
+    assert [item.type for item in first.idata] == ['r01', 'rin']
+    # the items of the second page have only been scanned
+    assert second._imap is None
+
+    # the armor on the second page follows the page header
+    offset = int(second._offset) + 11
+    data = Item.scan_data(stash._buffer, offset)
+    assert len(data) == Item.scan_length(stash._buffer, offset) == second.length - 11
+
+    # the raw data is enough to copy the item into another file
+    copy = SaveFile.from_data(b'JM' + struct.pack('<L', 0x60) + bytes(data))
+    assert copy.item.type == 'qui' and copy.item.raw_data == second.idata[0].raw_data
+
+
+def test_decoded_header(stash_data):
+    stash = SaveFile.from_data(stash_data)
+    armor = stash.pages[1].idata[0]
+    # the fixed header fields are decoded at construction
+    assert {'_is_identified_field', '_quality_field', '_uid_field'} <= set(vars(armor))
+
+    # writes keep the decoded values coherent with the buffer
+    identified = armor.is_identified
+    armor.is_identified = not identified
+    assert armor.is_identified is not identified
+    assert Item.from_data(stash._buffer, int(armor._offset)).is_identified is not identified
+
+
+def test_sections():
+    # the item section is broken, which only matters once it is parsed
+    data = character('Tester', 42, 1234)[:-10] + b'JX\0\0jfkf\0'
+    with pytest.raises(ValueError):
+        SaveFile.from_data(data)
+
+    save = SaveFile.from_data(data, sections={'character', 'quests'})
+    assert {'character', 'questdata'} <= set(vars(save))
+    assert 'itemdata' not in vars(save) and 'waypointdata' not in vars(save)
+    assert save.character.stats[Stat.LEVEL] == 42
+
+    # the other sections are parsed on first access
+    assert save.waypointdata is save.waypointdata
+    with pytest.raises(ValueError):
+        _ = save.itemdata
+
+    with pytest.raises(ValueError):
+        SaveFile.from_data(data, sections={'inventory'})
+
+
+def test_mercenary_experience():
+    save = SaveFile.from_data(character('Tester', 42, 1234))
+    merc = save.mercenary
+    merc.control_seed = 0x12345678
+
+    # the experience is a 32 bit field, values above 16 bits are written in full
+    merc.experience = 0x12345
+    assert merc.experience == 0x12345
+    assert save._buffer.unpack_from('<L', 187)[0] == 0x12345
+    assert SaveFile.from_data(bytes(save._buffer)).mercenary.experience == 0x12345
+    assert merc.control_seed == 0x12345678 and merc.type_id == 0
@@ -0,0 +1,18 @@
+from pyd2s.gamedata import GameData
+from pyd2s_stat import pyd2s_stat
+
+
+def test_print_items_read_only(tmp_path, monkeypatch, capsys, stash_data):
+    # the item names are looked up by key only, independent of the string tables
+    monkeypatch.setattr(GameData, '_load_strings', dict)
+    path = tmp_path / 'stash.sss'
+    path.write_bytes(stash_data)
+
+    pyd2s_stat(['-i', str(path)])
+    out = capsys.readouterr().out
+    assert 'Pages       : 2' in out
+    assert out.count('\n    0 ') == 2 and out.count('\n    1 ') == 1
+
+    pyd2s_stat(['-a', str(path)])
+    assert capsys.readouterr().out.count('\n    0 ') == 2
+    assert path.read_bytes() == stash_data